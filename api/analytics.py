@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+
+from services import analytics, db_routing
+
+# Read-only sales reports, served from the rollup tables (services/analytics.py)
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/admin/analytics')
+
+
+@analytics_bp.errorhandler(analytics.AnalyticsQueryError)
+def bad_query(e):
+    return jsonify({'error': str(e)}), 400
+
+
+# ---- Routes ----
+
+@analytics_bp.route('/top_products', methods=['GET'])
+@db_routing.read_only
+def get_top_products():
+    since, until = analytics.parse_range(request.args)
+    limit = analytics.parse_limit(request.args.get('limit'))
+    by = request.args.get('by', 'revenue')
+    if by not in ('revenue', 'units'):
+        return jsonify({'error': 'by must be revenue or units'}), 400
+    return jsonify(analytics.top_products(since, until, limit=limit, by=by)), 200
+
+
+@analytics_bp.route('/revenue', methods=['GET'])
+@db_routing.read_only
+def get_daily_revenue():
+    since, until = analytics.parse_range(request.args)
+    product_id = request.args.get('product_id', type=int)
+    return jsonify(analytics.daily_revenue(since, until, product_id=product_id)), 200
+
+
+@analytics_bp.route('/lifetime_value', methods=['GET'])
+@db_routing.read_only
+def get_top_customers():
+    limit = analytics.parse_limit(request.args.get('limit'))
+    return jsonify(analytics.top_customers(limit)), 200
+
+
+@analytics_bp.route('/lifetime_value/<int:user_id>', methods=['GET'])
+@db_routing.read_only
+def get_lifetime_value(user_id):
+    value = analytics.lifetime_value(user_id)
+    if value is None:
+        return jsonify({'error': 'No purchases for this user'}), 404
+    return jsonify(value), 200
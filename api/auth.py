@@ -1,38 +1,22 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import uuid
 
 from extensions import db  # reuse same SQLAlchemy instance
+from models.auth import User, Token
+from services import hashing, rate_limit, tokens
+from services.serializers import USER, USER_SUMMARY
 
 auth_bp = Blueprint("auth", __name__)
 
 
-# ---- Models ----
-class User(db.Model):
-    __tablename__ = "users"
-
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    username = db.Column(db.String(150), unique=True, nullable=False)
-    email = db.Column(db.String(255), unique=True, nullable=False)
-    password = db.Column(db.String(255), nullable=False)
-    phone_number = db.Column(db.String(20), nullable=True)
-    address = db.Column(db.String(255), nullable=True)
-
-    tokens = db.relationship("Token", backref="user", cascade="all, delete-orphan")
-
-
-class Token(db.Model):
-    __tablename__ = "tokens"
-
-    token = db.Column(db.String(255), primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
+@auth_bp.errorhandler(hashing.HashingBusy)
+def hashing_busy(e):
+    return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
 
 
 # ---- Routes ----
 
 @auth_bp.route("/signup", methods=["POST"])
+@rate_limit.limit(ip='10/minute')
 def signup():
     data = request.get_json()
     username = data.get("username")
@@ -44,12 +28,12 @@ def signup():
     if not username or not email or not password:
         return jsonify({"error": "Missing fields"}), 400
 
-    hashed_password = generate_password_hash(password)
-
     existing_user = User.query.filter((User.username == username) | (User.email == email)).first()
     if existing_user:
         return jsonify({"error": "Username or email already exists"}), 409
 
+    hashed_password = hashing.hash_password(password)
+
     user = User(
         username=username,
         email=email,
@@ -60,11 +44,7 @@ def signup():
     db.session.add(user)
     db.session.commit()
 
-    token_str = str(uuid.uuid4())
-    expires_at = datetime.now() + timedelta(hours=1)
-    token = Token(token=token_str, user_id=user.id, expires_at=expires_at)
-    db.session.add(token)
-    db.session.commit()
+    token_str = tokens.issue(user.id)
 
     return jsonify({
         "message": "Signup successful",
@@ -74,6 +54,7 @@ def signup():
 
 
 @auth_bp.route("/login", methods=["POST"])
+@rate_limit.limit(ip='30/minute', user='10/minute')
 def login():
     data = request.get_json()
     username = data.get("username")
@@ -81,12 +62,15 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and check_password_hash(user.password, password):
-        token_str = str(uuid.uuid4())
-        expires_at = datetime.now() + timedelta(hours=1)
-        token = Token(token=token_str, user_id=user.id, expires_at=expires_at)
-        db.session.add(token)
-        db.session.commit()
+    if user and hashing.check_password(user.password, password):
+        if hashing.needs_rehash(user.password):
+            # hash parameters changed since this password was stored
+            try:
+                user.password = hashing.hash_password(password)
+                db.session.commit()
+            except hashing.HashingBusy:
+                pass  # upgrade on a later login
+        token_str = tokens.issue(user.id)
         return jsonify({"message": "Login successful", "token": token_str, "user_id": user.id}), 200
 
     return jsonify({"error": "Invalid credentials"}), 401
@@ -103,12 +87,12 @@ def token_required(f):
             return jsonify({"message": "Token is missing!"}), 401
 
         token_str = token_str.replace("Bearer ", "")
-        token = Token.query.filter(Token.token == token_str, Token.expires_at > datetime.now()).first()
+        user_id = tokens.verify(token_str)  # signature + expiry in memory, no DB lookup
 
-        if not token:
+        if user_id is None:
             return jsonify({"message": "Token is invalid or expired!"}), 401
 
-        request.user_id = token.user_id
+        request.user_id = user_id
         return f(*args, **kwargs)
 
     return decorated_function
@@ -119,13 +103,7 @@ def token_required(f):
 def user_profile():
     user = User.query.get(request.user_id)
     if user:
-        return jsonify({
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "phone_number": user.phone_number,
-            "address": user.address
-        }), 200
+        return jsonify(USER.dump(user)), 200
     return jsonify({"error": "User not found"}), 404
 
 
@@ -139,19 +117,14 @@ def check_login():
 @token_required
 def logout():
     token_str = request.headers.get("Authorization").replace("Bearer ", "")
-    token = Token.query.filter_by(token=token_str).first()
-    if token:
-        db.session.delete(token)
-        db.session.commit()
+    tokens.revoke(token_str)
     return jsonify({"message": "Logout successful"}), 200
 
 
 @auth_bp.route("/get_users", methods=["GET"])
 def get_users():
-    users = User.query.all()
-    return jsonify(
-        {"users": [{"id": u.id, "username": u.username, "email": u.email} for u in users]}
-    ), 200
+    users = db.session.execute(USER_SUMMARY.select()).all()
+    return jsonify({"users": USER_SUMMARY.dump_many(users)}), 200
 
 
 @auth_bp.route("/user_profile", methods=["PUT"])
@@ -179,11 +152,15 @@ def update_user_profile():
     user.username = username
     user.email = email
     if password:
-        user.password = generate_password_hash(password)
+        user.password = hashing.hash_password(password)
 
     db.session.commit()
     return jsonify({"message": "Profile updated successfully"}), 200
 
+@auth_bp.route("/hash_stats", methods=["GET"])
+def get_hash_stats():
+    return jsonify(hashing.get_executor().snapshot()), 200
+
 @auth_bp.route("/admin/login", methods=["POST"])
 def admin_login():
     data = request.get_json()
@@ -1,38 +1,37 @@
-from flask import Blueprint, request, jsonify
-import os
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 import datetime
+import hashlib
 import razorpay
 from extensions import db
-from api.products import Product
+from models.cart import Cart, OrdersHistory
+from services import db_routing, exports, inventory, orders, payments, pricing, rate_limit
+from services.serializers import CART, ORDERS_HISTORY, USER_ORDERS_HISTORY
+from services.sql import upsert_insert
 
 # ---- Config ----
 cart_bp = Blueprint('cart', __name__)
 # db = SQLAlchemy()
 
-razorpay_client = razorpay.Client(
-    auth=(os.environ.get('RAZORPAY_KEY_ID'), os.environ.get('RAZORPAY_KEY_SECRET'))
-)
-
-# ---- Models ----
-class Cart(db.Model):
-    __tablename__ = "cart"
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, nullable=False)
-    product_id = db.Column(db.Integer, nullable=False)
-    product_name = db.Column(db.String(255), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
-
-class OrdersHistory(db.Model):
-    __tablename__ = "orders_history"
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, nullable=False)
-    product_id = db.Column(db.Integer, nullable=False)
-    product_name = db.Column(db.String(255), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
-    price_at_purchase = db.Column(db.Float, nullable=False)
-    purchase_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    phone_number = db.Column(db.String(20), nullable=True)
-    address = db.Column(db.String(255), nullable=True)
+
+@cart_bp.errorhandler(payments.GatewayUnavailable)
+def gateway_unavailable(e):
+    return jsonify({'error': 'Payment gateway unavailable, please retry'}), 503, {'Retry-After': '5'}
+
+
+@cart_bp.errorhandler(inventory.OutOfStock)
+def out_of_stock(e):
+    return jsonify({'error': 'Insufficient stock', 'product_id': e.product_id, 'available': e.available}), 409
+
+
+def parse_user_id(data):
+    """The body's user_id as an int (clients send "5" as well as 5), or None
+    if it is missing. Raises ValueError if it isn't an integer."""
+    value = data.get('user_id')
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'user_id must be an integer, got {value!r}')
+    return int(value)
 
 
 # ---- Routes ----
@@ -47,37 +46,52 @@ def add_to_cart():
     if not user_id or not product_id or not product_name or not quantity:
         return jsonify({'error': 'Missing fields'}), 400
 
-    item = Cart(user_id=user_id, product_id=product_id, product_name=product_name, quantity=quantity)
-    db.session.add(item)
+    # single statement: a new line, or the quantity merged into the existing one
+    stmt = upsert_insert(Cart).values(
+        user_id=user_id, product_id=product_id, product_name=product_name, quantity=quantity
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id, Cart.product_id],
+        set_={'quantity': Cart.quantity + stmt.excluded.quantity, 'product_name': stmt.excluded.product_name}
+    )
+    db.session.execute(stmt)
     db.session.commit()
 
     return jsonify({'message': 'Item added to cart successfully'}), 201
 
 @cart_bp.route('/cart/<int:user_id>', methods=['GET'])
+@db_routing.read_only
 def get_user_cart(user_id):
-    items = Cart.query.filter_by(user_id=user_id).all()
-    return jsonify([{
-        "id": i.id,
-        "user_id": i.user_id,
-        "product_id": i.product_id,
-        "product_name": i.product_name,
-        "quantity": i.quantity
-    } for i in items]), 200
+    view = request.args.get('view', 'lines')
+    if view == 'summary':
+        # current prices, images and totals for the cart page
+        return jsonify(pricing.cart_summary(user_id)), 200
+    if view != 'lines':
+        return jsonify({'error': 'view must be lines or summary'}), 400
+    items = db.session.execute(CART.select().where(Cart.user_id == user_id)).all()
+    return jsonify(CART.dump_many(items)), 200
 
 @cart_bp.route('/orders_history', methods=['GET'])
+@db_routing.read_only
 def get_all_orders_history():
-    orders = OrdersHistory.query.order_by(OrdersHistory.purchase_date.desc()).all()
-    return jsonify([{
-        "id": o.id,
-        "user_id": o.user_id,
-        "product_id": o.product_id,
-        "product_name": o.product_name,
-        "quantity": o.quantity,
-        "price_at_purchase": o.price_at_purchase,
-        "purchase_date": o.purchase_date.isoformat(),
-        "phone_number": o.phone_number,
-        "address": o.address
-    } for o in orders]), 200
+    try:
+        filters = exports.parse_filters(request.args)
+    except exports.ExportQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fmt = request.args.get('format', 'json')
+    if fmt in exports.FORMATS:
+        # chunked response generated from a server-side cursor
+        response = Response(stream_with_context(exports.stream(fmt, filters)), mimetype=exports.FORMATS[fmt])
+        if fmt == 'csv':
+            response.headers['Content-Disposition'] = 'attachment; filename=orders_history.csv'
+        return response
+    if fmt != 'json':
+        return jsonify({'error': 'format must be json, ndjson or csv'}), 400
+
+    stmt = exports.apply_filters(ORDERS_HISTORY.select(), filters)
+    orders = db.session.execute(stmt.order_by(OrdersHistory.purchase_date.desc())).all()
+    return jsonify(ORDERS_HISTORY.dump_many(orders)), 200
 
 @cart_bp.route('/cart/<int:item_id>', methods=['DELETE'])
 def remove_from_cart(item_id):
@@ -106,42 +120,48 @@ def update_cart_item_quantity(item_id):
 
 # ---- Checkout APIs ----
 @cart_bp.route('/cart/checkout', methods=['POST'])
+@rate_limit.limit(ip='30/minute', user='10/minute')
 def checkout_cart():
     data = request.get_json()
-    user_id = data.get('user_id')
+    try:
+        user_id = parse_user_id(data)
+    except ValueError:
+        return jsonify({'error': 'User ID must be an integer'}), 400
 
     if not user_id:
         return jsonify({'error': 'User ID is required'}), 400
 
-    cart_items = Cart.query.filter_by(user_id=user_id).all()
-    if not cart_items:
+    quote = pricing.price_cart(user_id)
+    if not quote['lines']:
         return jsonify({'message': 'Cart is empty'}), 400
-
-    total_amount = 0
-    for item in cart_items:
-        product = Product.query.get(item.product_id)
-        if product:
-            total_amount += product.prize * item.quantity
-
-    order_amount = int(total_amount * 100)  # Razorpay expects paise
+    hold = inventory.reserve(quote, current_app.config['STOCK_RESERVATION_TTL'])
 
     order_data = {
-        'amount': order_amount,
+        'amount': quote['total_paise'],  # Razorpay expects paise
         'currency': 'INR',
         'receipt': f'order_rcptid_{user_id}_{datetime.datetime.now().timestamp()}'
     }
-    razorpay_order = razorpay_client.order.create(order_data)
+    try:
+        razorpay_order = payments.get_gateway().create_order(order_data)
+        orders.record_pending(razorpay_order['id'], quote, 'cart', user_id=user_id,
+                              phone_number=data.get('phone_number'), address=data.get('address'), hold=hold)
+    except Exception:
+        inventory.release(hold)
+        raise
 
     return jsonify({
         'message': 'Checkout successful',
         'order_id': razorpay_order['id'],
-        'razorpay_key': os.environ.get('RAZORPAY_KEY_ID'),
+        'razorpay_key': current_app.config['RAZORPAY_KEY_ID'],
         'amount': razorpay_order['amount'],
-        'currency': razorpay_order['currency']
+        'currency': razorpay_order['currency'],
+        'lines': quote['lines'],
+        'reserved_until': hold.expires_at if hold else None
     }), 200
 
 
 @cart_bp.route('/cart/buy_item', methods=['POST'])
+@rate_limit.limit(ip='30/minute', user='10/minute')
 def buy_single_item():
     data = request.get_json()
     product_id = data.get('product_id')
@@ -150,43 +170,55 @@ def buy_single_item():
     if not product_id:
         return jsonify({'error': 'Product ID is required'}), 400
 
-    product = Product.query.get(product_id)
-    if not product:
-        return jsonify({'message': 'Product not found'}), 404
+    if not isinstance(quantity, int) or quantity < 1:
+        return jsonify({'error': 'Quantity must be positive integer'}), 400
 
-    order_amount = int(product.prize * quantity * 100)
+    try:
+        user_id = parse_user_id(data)
+    except ValueError:
+        return jsonify({'error': 'User ID must be an integer'}), 400
+
+    quote = pricing.price_item(product_id, quantity)
+    if not quote:
+        return jsonify({'message': 'Product not found'}), 404
+    hold = inventory.reserve(quote, current_app.config['STOCK_RESERVATION_TTL'])
 
     order_data = {
-        'amount': order_amount,
+        'amount': quote['total_paise'],
         'currency': 'INR',
         'receipt': f'order_rcptid_{product_id}_{datetime.datetime.now().timestamp()}',
         'notes': {
             'quantity': quantity
         }
     }
-    razorpay_order = razorpay_client.order.create(order_data)
+    try:
+        razorpay_order = payments.get_gateway().create_order(order_data)
+        orders.record_pending(razorpay_order['id'], quote, 'item', user_id=user_id,
+                              phone_number=data.get('phone_number'), address=data.get('address'), hold=hold)
+    except Exception:
+        inventory.release(hold)
+        raise
 
     return jsonify({
         'message': 'Checkout successful',
         'order_id': razorpay_order['id'],
-        'razorpay_key': os.environ.get('RAZORPAY_KEY_ID'),
+        'razorpay_key': current_app.config['RAZORPAY_KEY_ID'],
         'amount': razorpay_order['amount'],
-        'currency': razorpay_order['currency']
+        'currency': razorpay_order['currency'],
+        'lines': quote['lines'],
+        'reserved_until': hold.expires_at if hold else None
     }), 200
 
 
 @cart_bp.route('/orders_history/<int:user_id>', methods=['GET'])
+@db_routing.read_only
 def get_user_orders_history(user_id):
-    orders = OrdersHistory.query.filter_by(user_id=user_id).order_by(OrdersHistory.purchase_date.desc()).all()
-    return jsonify([{
-        "id": o.id,
-        "user_id": o.user_id,
-        "product_id": o.product_id,
-        "product_name": o.product_name,
-        "quantity": o.quantity,
-        "price_at_purchase": o.price_at_purchase,
-        "purchase_date": o.purchase_date.isoformat()
-    } for o in orders]), 200
+    orders = db.session.execute(
+        USER_ORDERS_HISTORY.select()
+        .where(OrdersHistory.user_id == user_id)
+        .order_by(OrdersHistory.purchase_date.desc())
+    ).all()
+    return jsonify(USER_ORDERS_HISTORY.dump_many(orders)), 200
 
 
 @cart_bp.route('/cart/verify_payment', methods=['POST'])
@@ -195,9 +227,12 @@ def verify_payment():
     razorpay_order_id = data.get('razorpay_order_id')
     razorpay_payment_id = data.get('razorpay_payment_id')
     razorpay_signature = data.get('razorpay_signature')
-    user_id = data.get('user_id')
     phone_number = data.get('phone_number')
     address = data.get('address')
+    try:
+        user_id = parse_user_id(data)
+    except ValueError:
+        return jsonify({'error': 'User ID must be an integer'}), 400
 
     if not user_id:
         return jsonify({'error': 'User ID is required'}), 400
@@ -209,54 +244,45 @@ def verify_payment():
     }
 
     try:
-        razorpay_client.utility.verify_payment_signature(params_dict)
+        payments.get_gateway().verify_payment_signature(params_dict)
     except razorpay.errors.SignatureVerificationError:
         return jsonify({'error': 'Invalid payment signature'}), 400
 
-    cart_items = Cart.query.filter_by(user_id=user_id).all()
+    # one local transaction: ledger -> orders_history, purchased cart lines removed
+    placed = orders.finalize_order(
+        razorpay_order_id,
+        razorpay_payment_id=razorpay_payment_id,
+        user_id=user_id,
+        phone_number=phone_number,
+        address=address
+    )
+    if placed is None and not orders.is_finalized(razorpay_order_id):
+        # no ledger row: created before the ledger existed (see services/orders.py)
+        try:
+            razorpay_order = payments.get_gateway().fetch_order(razorpay_order_id)
+        except razorpay.errors.BadRequestError:
+            return jsonify({'error': 'Order not found'}), 404
+        if not orders.adopt_legacy_order(razorpay_order, user_id, phone_number=phone_number, address=address):
+            return jsonify({'error': 'Order not found'}), 404
+        orders.finalize_order(razorpay_order_id, razorpay_payment_id=razorpay_payment_id, user_id=user_id,
+                              phone_number=phone_number, address=address)
 
-    # if not cart_items:
-        # Handle single item purchase
-    try:
-        order = razorpay_client.order.fetch(razorpay_order_id)
-        receipt = order['receipt']
-        product_id = int(receipt.split('_')[2])
-        quantity = order['notes']['quantity']
-
-        product = Product.query.get(product_id)
-
-        if product:
-            new_order = OrdersHistory(
-                user_id=user_id,
-                product_id=product.id,
-                product_name=product.name,
-                quantity=quantity,
-                price_at_purchase=product.prize,
-                purchase_date=datetime.datetime.utcnow(),
-                phone_number=phone_number,
-                address=address
-            )
-            db.session.add(new_order)
-    except Exception as e:
-            return jsonify({'error': str(e)}), 500
-    # else:
-    #     # Move items from cart to orders_history
-    #     for item in cart_items:
-    #         product = Product.query.get(item.product_id)
-    #         if product:
-    #             new_order = OrdersHistory(
-    #                 user_id=user_id,
-    #                 product_id=item.product_id,
-    #                 product_name=item.product_name,
-    #                 quantity=item.quantity,
-    #                 price_at_purchase=product.prize,
-    #                 purchase_date=datetime.datetime.utcnow(),
-    #                 phone_number=phone_number,
-    #                 address=address
-    #             )
-    #             db.session.add(new_order)
-    #             db.session.delete(item)
+    return jsonify({'message': 'Payment successful and order placed'}), 200
 
-    db.session.commit()
 
-    return jsonify({'message': 'Payment successful and order placed'}), 200
+@cart_bp.route('/cart/razorpay_webhook', methods=['POST'])
+def razorpay_webhook():
+    body = request.get_data()
+    signature = request.headers.get('X-Razorpay-Signature')
+    secret = current_app.config['RAZORPAY_WEBHOOK_SECRET']
+    if not payments.get_gateway().verify_webhook_signature(body, signature, secret):
+        return jsonify({'error': 'Invalid webhook signature'}), 400
+
+    event = request.get_json(silent=True)
+    if not isinstance(event, dict):
+        return jsonify({'error': 'Invalid payload'}), 400
+
+    # queue only; orders are written in batches by orders.drain_events
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body).hexdigest()
+    orders.enqueue_event(event_id, event)
+    return jsonify({'status': 'ok'}), 200
@@ -0,0 +1,11 @@
+from flask import Blueprint
+
+from services import metrics, rate_limit
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@rate_limit.exempt
+def get_metrics():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -1,17 +1,56 @@
 from flask import Blueprint, request, jsonify, current_app, send_file
-from werkzeug.utils import secure_filename
-import os
-import io
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from extensions import db  # reuse same SQLAlchemy instance
 from models.product import Product, ProductImage 
+from services import catalog, catalog_cache, db_routing, rate_limit, catalog_import, image_store, image_variants, inventory, search
 
 products_bp = Blueprint('products', __name__)
 
 
+@products_bp.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': 'Request body too large'}), 413
+
+
+@products_bp.errorhandler(image_store.ImageRejected)
+def image_rejected(e):
+    db.session.rollback()
+    return jsonify({'error': str(e)}), e.status
+
+
+def _add_images(product, files):
+    # streamed from the spooled upload into the store, never read() whole
+    store = image_store.get_store()
+    added = []
+    for image in files:
+        if image:
+            img = ProductImage(product_id=product.id)
+            store.attach_stream(img, image.stream)
+            db.session.add(img)
+            added.append(img)
+    return added
+
+
+def _parse_stock(value):
+    # None for a missing or empty field (stock not tracked / unchanged)
+    if value in (None, ''):
+        return None
+    if not value.isdigit():
+        raise ValueError('stock must be a non-negative integer')
+    return int(value)
+
+
+def _schedule_variants(images):
+    # resized/WebP derivatives are built off the request path, after commit
+    if images:
+        image_variants.schedule(image_store.get_store(), images)
+
+
 # ---- Routes ----
 
 @products_bp.route('/upload', methods=['POST'])
+@rate_limit.limit(ip='30/minute')
 def upload():
     name = request.form.get('name')
     prize = request.form.get('prize')
@@ -22,45 +61,102 @@ def upload():
 
     if not (name and prize and details):
         return jsonify({'error': 'Missing fields'}), 400
+    try:
+        stock = _parse_stock(request.form.get('stock'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     product = Product(
         name=name,
         prize=float(prize),
         details=details,
         line_description=line_description,
-        benefit=benefit
+        benefit=benefit,
+        stock=stock
     )
     db.session.add(product)
-    db.session.commit()
-
-    for image in images:
-        if image:
-            img_data = image.read()  # read file as binary
-            mimetype = image.mimetype
-            img = ProductImage(product_id=product.id, image_data=img_data, mimetype=mimetype)
-            db.session.add(img)
+    db.session.flush()  # product.id for the images; nothing is kept if one is rejected
 
+    added = _add_images(product, images)
+    search.index_product(product)
     db.session.commit()
+    catalog_cache.invalidate()
+    _schedule_variants(added)
 
     return jsonify({'message': 'Product saved successfully'}), 201
 
 
+@products_bp.route('/products/import', methods=['POST'])
+def import_products():
+    # manifests with an image archive are far larger than a product upload
+    request.max_content_length = current_app.config['IMPORT_MAX_CONTENT_LENGTH']
+    manifest = request.files.get('manifest')
+    if not manifest:
+        return jsonify({'error': 'manifest file is required'}), 400
+    batch_size = request.args.get('batch_size', current_app.config['IMPORT_BATCH_SIZE'], type=int)
+    if not 1 <= batch_size <= 5000:
+        return jsonify({'error': 'batch_size must be between 1 and 5000'}), 400
+
+    try:
+        fmt = catalog_import.manifest_format(manifest.filename or '', request.args.get('format'))
+        archive = catalog_import.ImageArchive(request.files.get('images'), current_app.config['IMAGE_MAX_BYTES'])
+    except catalog_import.CatalogImportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        report = catalog_import.run(manifest.stream, fmt, archive, batch_size)
+    finally:
+        archive.close()
+    if report['created']:
+        catalog_cache.invalidate()
+
+    return jsonify(report), 201 if report['created'] else 400
+
+
 @products_bp.route('/products', methods=['GET'])
+@db_routing.read_only
+@catalog_cache.cached
 def get_products():
-    products = Product.query.all()
+    try:
+        fields = catalog.parse_fields(request.args.get('fields'), catalog.LIST_FIELDS)
+        after, limit = catalog.parse_page(request.args.get('after'), request.args.get('limit'))
+    except catalog.CatalogQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    result, next_after = catalog.list_products(fields, after=after, limit=limit)
+
+    response = jsonify(result)
+    if next_after is not None:
+        response.headers['X-Next-After'] = str(next_after)
+    return response, 200
+
+
+@products_bp.route('/products/search', methods=['GET'])
+@db_routing.read_only
+@catalog_cache.cached
+def search_products():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        fields = catalog.parse_fields(request.args.get('fields'), catalog.LIST_FIELDS)
+        offset, limit = search.parse_page(request.args.get('offset'), request.args.get('limit'))
+    except (catalog.CatalogQueryError, search.SearchQueryError) as e:
+        return jsonify({'error': str(e)}), 400
 
-    result = []
-    for product in products:
-        image_urls = [f"/product_images/{img.id}" for img in product.images]
-        result.append({
-            'id': product.id,
-            'name': product.name,
-            'prize': product.prize,
-            'details': product.details,
-            'images': image_urls
-        })
+    ids, next_offset = search.search(q, offset=offset, limit=limit)
 
-    return jsonify(result), 200
+    response = jsonify(catalog.get_products_by_ids(ids, fields))
+    if next_offset is not None:
+        response.headers['X-Next-Offset'] = str(next_offset)
+    return response, 200
+
+
+@products_bp.route('/products/autocomplete', methods=['GET'])
+@db_routing.read_only
+@catalog_cache.cached
+def autocomplete_products():
+    return jsonify(search.autocomplete(request.args.get('q', ''))), 200
 
 
 @products_bp.route('/products/<int:product_id>', methods=['DELETE'])
@@ -70,28 +166,27 @@ def delete_product(product_id):
         return jsonify({'error': 'Product not found'}), 404  
 
     db.session.delete(product)
+    search.remove_product(product_id)
     db.session.commit()
+    catalog_cache.invalidate()
 
     return jsonify({'message': 'Product deleted successfully'}), 200
 
 
 @products_bp.route('/products/<int:product_id>', methods=['GET'])
+@db_routing.read_only
+@catalog_cache.cached
 def get_product(product_id):
-    product = Product.query.get(product_id)
+    try:
+        fields = catalog.parse_fields(request.args.get('fields'), catalog.DETAIL_FIELDS)
+    except catalog.CatalogQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    product = catalog.get_product(product_id, fields)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
 
-    image_urls = [f"/product_images/{img.id}" for img in product.images]
-
-    return jsonify({
-        'id': product.id,
-        'name': product.name,
-        'prize': product.prize,
-        'details': product.details,
-        'benefit': product.benefit,
-        'line_description': product.line_description,
-        'images': image_urls
-    }), 200
+    return jsonify(product), 200
 
 
 @products_bp.route("/products/<int:product_id>", methods=["PUT"])
@@ -104,6 +199,10 @@ def update_product(product_id):
     prize = request.form.get("prize")
     details = request.form.get("details")
     new_images = request.files.getlist("images")
+    try:
+        stock = _parse_stock(request.form.get("stock"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # Update product details
     if name:
@@ -112,26 +211,84 @@ def update_product(product_id):
         product.prize = float(prize)
     if details:
         product.details = details
+    if stock is not None:
+        # an absolute count from a stocktake; use POST /stock to restock during a sale
+        product.stock = stock
 
     # Replace images if new ones uploaded
+    added = []
     if new_images:
         # Delete old images from DB
         ProductImage.query.filter_by(product_id=product.id).delete()
 
         # Add new images
-        for image in new_images:
-            img_data = image.read()
-            mimetype = image.mimetype
-            new_img = ProductImage(product_id=product.id, image_data=img_data, mimetype=mimetype)
-            db.session.add(new_img)
+        added = _add_images(product, new_images)
 
+    search.index_product(product)
     db.session.commit()
+    catalog_cache.invalidate()
+    _schedule_variants(added)
     return jsonify({"message": "Product updated successfully"}), 200
 
+@products_bp.route('/products/<int:product_id>/stock', methods=['GET'])
+def get_product_stock(product_id):
+    # always the primary: stock moves with every checkout
+    level = inventory.stock_level(product_id)
+    if level is None:
+        return jsonify({'error': 'Product not found'}), 404
+    return jsonify(level), 200
+
+
+@products_bp.route('/products/<int:product_id>/stock', methods=['POST'])
+def adjust_product_stock(product_id):
+    data = request.get_json(silent=True) or {}
+    delta = data.get('add')
+    if not isinstance(delta, int) or isinstance(delta, bool):
+        return jsonify({'error': 'add must be an integer'}), 400
+
+    stock = inventory.adjust(product_id, delta)
+    if stock is None:
+        level = inventory.stock_level(product_id)
+        if level is None:
+            return jsonify({'error': 'Product not found'}), 404
+        if level['stock'] is None:
+            return jsonify({'error': 'Stock is not tracked for this product'}), 409
+        return jsonify({'error': 'Insufficient stock', 'available': level['stock']}), 409
+    return jsonify({'product_id': product_id, 'stock': stock}), 200
+
+
+@products_bp.route('/products/cache_stats', methods=['GET'])
+def get_catalog_cache_stats():
+    return jsonify(catalog_cache.get_cache().snapshot()), 200
+
+
 @products_bp.route("/product_images/<int:image_id>", methods=["GET"])
+@db_routing.read_only
 def get_product_image(image_id):
     img = ProductImage.query.get(image_id)
     if not img:
         return jsonify({"error": "Image not found"}), 404
 
-    return send_file(io.BytesIO(img.image_data), mimetype=img.mimetype)
\ No newline at end of file
+    store = image_store.get_store()
+    width = request.args.get('w', type=int)
+    if not width or width < 1 or not img.content_hash:
+        return store.send(img)
+
+    pipeline = image_variants.get_pipeline()
+    accept_webp = request.accept_mimetypes['image/webp'] > 0
+    variant = pipeline.find(img.content_hash, width, accept_webp)
+    if variant is None:
+        # not generated yet: serve the original, but don't let caches keep it
+        response = store.send(img, max_age=60)
+    else:
+        path, mimetype, variant_width = variant
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            etag=f"{img.content_hash}-w{variant_width}-{mimetype.split('/')[1]}",
+            conditional=True,
+            max_age=image_store.CACHE_MAX_AGE,
+        )
+        response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
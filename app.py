@@ -1,30 +1,131 @@
 from flask import Flask
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 import os
 from dotenv import load_dotenv
 from extensions import db, DATABASE_URL
 from flask_migrate import Migrate
+from commands import register_commands
+from services import async_db, catalog_cache, db_routing, hashing, image_store, image_variants, inventory, metrics, orders, payments, rate_limit, search, serializers, tokens, uploads
 
 from api.products import products_bp
 from api.cart import cart_bp
 from api.auth import auth_bp
+from api.analytics import analytics_bp
+from api.metrics import metrics_bp
 
 load_dotenv()
 migrate = Migrate()
 def create_app():
     app = Flask(__name__)
-    app.secret_key = os.urandom(24)  # Simple secret key for Flask
-    CORS(app, supports_credentials=True)
+    # Signs auth tokens, so every worker (and every restart) must share it.
+    # A random key is only acceptable for a single debug process.
+    app.secret_key = os.environ.get('SECRET_KEY')
+    if not app.secret_key:
+        if not app.debug:
+            raise RuntimeError('SECRET_KEY is not set; it signs auth tokens and must be the same in every worker '
+                               '(set FLASK_DEBUG=1 to use a throwaway key in development)')
+        app.logger.warning('SECRET_KEY is not set: using a random key, tokens will not survive a restart')
+        app.secret_key = os.urandom(24)
+    # cross-origin clients read the replica pin header and send it back
+    CORS(app, supports_credentials=True, expose_headers=[db_routing.PIN_HEADER])
 
     # Config for file uploads
     UPLOAD_FOLDER = 'static/uploads'
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    # Request size limits: bodies over MAX_CONTENT_LENGTH get a 413 before
+    # they are read; uploaded files past UPLOAD_SPOOL_BYTES are spooled to disk
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+    app.config['UPLOAD_SPOOL_BYTES'] = int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+    app.config['IMAGE_MAX_BYTES'] = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+
+    # Product image storage: "filesystem" (content-addressed files) or "database" (blobs)
+    app.config['IMAGE_STORAGE_BACKEND'] = os.environ.get('IMAGE_STORAGE_BACKEND', 'filesystem')
+    app.config['IMAGE_STORE_PATH'] = os.environ.get('IMAGE_STORE_PATH', os.path.join(UPLOAD_FOLDER, 'objects'))
+
+    # Resized/WebP derivatives served by /product_images/<id>?w=
+    app.config['IMAGE_VARIANT_PATH'] = os.environ.get('IMAGE_VARIANT_PATH', os.path.join(app.config['IMAGE_STORE_PATH'], 'variants'))
+    app.config['IMAGE_VARIANT_WIDTHS'] = os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1024')
+    app.config['IMAGE_VARIANT_WORKERS'] = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+    app.config['IMAGE_VARIANT_QUEUE'] = int(os.environ.get('IMAGE_VARIANT_QUEUE', 32))
+
+    # Bulk catalog import (/products/import)
+    app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    app.config['IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+
+    # Catalog response cache (per worker, invalidated through a shared version file)
+    app.config['CATALOG_VERSION_PATH'] = os.environ.get('CATALOG_VERSION_PATH')
+    app.config['CATALOG_CACHE_MAX_BYTES'] = int(os.environ.get('CATALOG_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    app.config['CATALOG_CACHE_TTL'] = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+    app.config['CATALOG_CACHE_STALE_TTL'] = int(os.environ.get('CATALOG_CACHE_STALE_TTL', 24 * 60 * 60))
+
+    # Auth tokens
+    app.config['TOKEN_TTL'] = int(os.environ.get('TOKEN_TTL', 60 * 60))
+    app.config['TOKEN_REVOCATION_VERSION_PATH'] = os.environ.get('TOKEN_REVOCATION_VERSION_PATH')
+    app.config['TOKEN_SWEEP_INTERVAL'] = int(os.environ.get('TOKEN_SWEEP_INTERVAL', 15 * 60))  # 0 disables
+
+    # Password hashing pool (werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:600000")
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+
+    # Razorpay gateway
+    app.config['RAZORPAY_KEY_ID'] = os.environ.get('RAZORPAY_KEY_ID')
+    app.config['RAZORPAY_KEY_SECRET'] = os.environ.get('RAZORPAY_KEY_SECRET')
+    app.config['RAZORPAY_WEBHOOK_SECRET'] = os.environ.get('RAZORPAY_WEBHOOK_SECRET')
+    app.config['PAYMENT_EVENTS_DRAIN_INTERVAL'] = float(os.environ.get('PAYMENT_EVENTS_DRAIN_INTERVAL', 5))  # 0 disables
+    app.config['RAZORPAY_CONNECT_TIMEOUT'] = float(os.environ.get('RAZORPAY_CONNECT_TIMEOUT', 3.05))
+    app.config['RAZORPAY_READ_TIMEOUT'] = float(os.environ.get('RAZORPAY_READ_TIMEOUT', 10))
+    app.config['RAZORPAY_POOL_SIZE'] = int(os.environ.get('RAZORPAY_POOL_SIZE', 10))
+    # connections for the async checkout app (asgi.py), which keeps many orders in flight
+    app.config['RAZORPAY_ASYNC_POOL_SIZE'] = int(os.environ.get('RAZORPAY_ASYNC_POOL_SIZE', 100))
+    app.config['RAZORPAY_RETRIES'] = int(os.environ.get('RAZORPAY_RETRIES', 2))
+    app.config['RAZORPAY_RETRY_BACKOFF'] = float(os.environ.get('RAZORPAY_RETRY_BACKOFF', 0.3))
+    app.config['RAZORPAY_BREAKER_THRESHOLD'] = int(os.environ.get('RAZORPAY_BREAKER_THRESHOLD', 5))
+    app.config['RAZORPAY_BREAKER_RESET'] = float(os.environ.get('RAZORPAY_BREAKER_RESET', 30))
+    # In-process emulator for offline/load testing: RAZORPAY_EMULATOR=1
+    app.config['RAZORPAY_EMULATOR'] = os.environ.get('RAZORPAY_EMULATOR', '0') == '1'
+    app.config['RAZORPAY_EMULATOR_LATENCY'] = float(os.environ.get('RAZORPAY_EMULATOR_LATENCY', 0))
+    app.config['RAZORPAY_EMULATOR_ERROR_RATE'] = float(os.environ.get('RAZORPAY_EMULATOR_ERROR_RATE', 0))
+
+    # Stock held for an unpaid checkout; the sweeper returns expired holds
+    app.config['STOCK_RESERVATION_TTL'] = int(os.environ.get('STOCK_RESERVATION_TTL', 15 * 60))
+    app.config['STOCK_SWEEP_INTERVAL'] = float(os.environ.get('STOCK_SWEEP_INTERVAL', 30))  # 0 disables
+
+    # Admission control: per-route token buckets (in memory per worker, or
+    # shared through Redis) and a per-process cap on requests in flight
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    app.config['RATE_LIMIT_REDIS_URL'] = os.environ.get('RATE_LIMIT_REDIS_URL')
+    app.config['RATE_LIMIT_MAX_KEYS'] = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+    app.config['RATE_LIMIT_PROXY_COUNT'] = int(os.environ.get('RATE_LIMIT_PROXY_COUNT', 0))  # trusted X-Forwarded-For hops
+    app.config['MAX_CONCURRENT_REQUESTS'] = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 256))  # 0 disables
+
+    # Instrumentation (/metrics); statements slower than this are logged
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
   
+    # Worker warmup under gunicorn (gunicorn.conf.py): WARMUP=1 opens the DB
+    # pools and requests WARMUP_PATHS before the worker takes traffic
+    app.config['WARMUP'] = os.environ.get('WARMUP', '0') == '1'
+    app.config['WARMUP_PATHS'] = [p for p in os.environ.get('WARMUP_PATHS', '/products').split(',') if p.strip()]
+
+    # asgi.py: threads running the Flask app next to the async checkout endpoints
+    app.config['ASGI_WSGI_THREADS'] = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+
     # ✅ Database setup (Postgres)
     app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool sizing, pre-ping, recycle and statement timeout from DB_* variables
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_routing.engine_options(DATABASE_URL, os.environ)
+    # Optional read replica for @read_only GET views; clients that just wrote
+    # read from the primary for DB_REPLICA_MAX_LAG seconds
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            db_routing.REPLICA: {'url': replica_url, **db_routing.engine_options(replica_url, os.environ)},
+        }
+    app.config['DB_REPLICA_MAX_LAG'] = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
 
     # Bind db to app
     # db.init_app(app)
@@ -33,6 +134,24 @@ def create_app():
     app.register_blueprint(products_bp)
     app.register_blueprint(cart_bp)
     app.register_blueprint(auth_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(metrics_bp)
     db.init_app(app)
     migrate.init_app(app, db)  
+    db_routing.init_app(app)
+    async_db.init_app(app)
+    rate_limit.init_app(app)  # first before_request hook
+    serializers.init_app(app)
+    uploads.init_app(app)
+    image_store.init_app(app)
+    image_variants.init_app(app)
+    catalog_cache.init_app(app)
+    search.init_app(app)
+    tokens.init_app(app)
+    hashing.init_app(app)
+    payments.init_app(app)
+    orders.init_app(app)
+    inventory.init_app(app)
+    metrics.init_app(app)
+    register_commands(app)
     return app
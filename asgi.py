@@ -0,0 +1,16 @@
+"""ASGI entry point: the async checkout endpoints in front of the Flask app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+
+POST /cart/checkout, /cart/buy_item and /cart/verify_payment are served by
+api/async_checkout.py on the event loop; every other request goes to the
+Flask app on a pool of ASGI_WSGI_THREADS threads. As with wsgi.py, nothing
+touches the schema at startup.
+"""
+from a2wsgi import WSGIMiddleware
+
+from api.async_checkout import AsyncCheckoutApp
+from app import create_app
+
+flask_app = create_app()
+app = AsyncCheckoutApp(flask_app, WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS']))
@@ -0,0 +1,96 @@
+import datetime
+import io
+import random
+
+from PIL import Image
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models.auth import User
+from models.cart import OrdersHistory
+from models.product import Product, ProductImage
+from services import analytics, hashing, image_store, search
+
+# Deterministic benchmark dataset: the same seed always produces the same
+# products, users and order history, so runs are comparable.
+
+PASSWORD = 'bench-password'
+WORDS = (
+    'neem', 'aloe', 'rose', 'sandal', 'turmeric', 'herbal', 'face', 'wash', 'gel', 'oil',
+    'soap', 'cream', 'hair', 'tonic', 'scrub', 'mask', 'serum', 'toner', 'balm', 'powder',
+)
+COLORS = ('red', 'green', 'blue', 'orange', 'purple', 'teal', 'olive', 'navy')
+
+
+def _png(color, size):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _words(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def is_seeded():
+    return db.session.execute(db.select(Product.id).limit(1)).first() is not None
+
+
+def seed(products=500, users=200, orders=5000, images_per_product=2, image_size=256, seed=1):
+    """Create tables and fill them; returns the dataset summary."""
+    rng = random.Random(seed)
+    db.create_all()
+    store = image_store.get_store()
+    images = [_png(color, image_size) for color in COLORS]
+
+    rows = [
+        Product(
+            name=f"{_words(rng, 2).title()} {i}",
+            prize=round(rng.uniform(49, 1999), 2),
+            details=_words(rng, 20),
+            line_description=_words(rng, 6),
+            benefit=_words(rng, 8),
+        )
+        for i in range(products)
+    ]
+    db.session.add_all(rows)
+    db.session.flush()
+    for product in rows:
+        for _ in range(images_per_product):
+            image = ProductImage(product_id=product.id)
+            store.attach(image, rng.choice(images))
+            db.session.add(image)
+    product_ids = [p.id for p in rows]
+    prices = {p.id: p.prize for p in rows}
+    names = {p.id: p.name for p in rows}
+    db.session.commit()
+
+    # one real hash with the configured method, shared by every user
+    pwhash = generate_password_hash(PASSWORD, hashing.get_executor().method)
+    db.session.execute(db.insert(User), [
+        {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': pwhash}
+        for i in range(users)
+    ])
+    user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+
+    start = datetime.datetime(2026, 1, 1)
+    history = []
+    for i in range(orders):
+        product_id = rng.choice(product_ids)
+        history.append({
+            'user_id': rng.choice(user_ids),
+            'product_id': product_id,
+            'product_name': names[product_id],
+            'quantity': rng.randint(1, 3),
+            'price_at_purchase': prices[product_id],
+            'purchase_date': start + datetime.timedelta(minutes=rng.randint(0, 300 * 24 * 60)),
+            'razorpay_order_id': f'order_bench{i}',
+        })
+    if history:
+        db.session.execute(db.insert(OrdersHistory), history)
+    db.session.commit()
+    analytics.rebuild()
+    search.reindex()
+
+    return {'products': products, 'images': products * images_per_product, 'users': users,
+            'orders': orders, 'seed': seed}
@@ -0,0 +1,95 @@
+import click
+from flask.cli import AppGroup
+
+from extensions import db
+from models.product import ProductImage
+from services import analytics, catalog_cache, image_store, image_variants, orders, search, tokens
+
+images_cli = AppGroup('images', help='Product image maintenance.')
+tokens_cli = AppGroup('tokens', help='Auth token maintenance.')
+payments_cli = AppGroup('payments', help='Payment event processing.')
+analytics_cli = AppGroup('analytics', help='Sales rollup maintenance.')
+search_cli = AppGroup('search', help='Product search index maintenance.')
+
+
+@images_cli.command('migrate')
+@click.option('--batch-size', default=100, show_default=True, help='Rows committed per batch.')
+def migrate_images(batch_size):
+    """Move image blobs out of product_images into the configured store."""
+    store = image_store.get_store()
+    if isinstance(store, image_store.DatabaseImageStore):
+        raise click.ClickException('IMAGE_STORAGE_BACKEND is "database"; nothing to migrate to.')
+    moved = image_store.migrate_blobs(store, batch_size=batch_size, log=click.echo)
+    click.echo(f"Done, {moved} images moved.")
+
+
+@images_cli.command('variants')
+def generate_variants():
+    """Generate missing resized/WebP variants synchronously (backfill)."""
+    store = image_store.get_store()
+    pipeline = image_variants.get_pipeline()
+    hashes = db.session.execute(
+        db.select(ProductImage.content_hash, db.func.min(ProductImage.id))
+        .where(ProductImage.content_hash.isnot(None))
+        .group_by(ProductImage.content_hash)
+    ).all()
+    done = 0
+    for content_hash, image_id in hashes:
+        if pipeline.is_complete(content_hash):
+            continue
+        image = db.session.get(ProductImage, image_id)
+        try:
+            pipeline.generate(content_hash, store.source(image))
+            done += 1
+        except Exception as e:
+            click.echo(f"Image {image_id}: {e}", err=True)
+        db.session.expunge(image)  # drop any loaded blob before the next row
+    click.echo(f"Done, variants generated for {done} images.")
+
+
+@tokens_cli.command('sweep')
+@click.option('--batch-size', default=1000, show_default=True)
+def sweep_tokens(batch_size):
+    """Delete expired tokens and revocations."""
+    click.echo(f"Deleted {tokens.sweep_expired(batch_size)} expired rows.")
+
+
+@payments_cli.command('drain')
+@click.option('--batch-size', default=100, show_default=True)
+def drain_payment_events(batch_size):
+    """Finalize queued Razorpay webhook events."""
+    click.echo(f"Processed {orders.drain_events(batch_size)} events.")
+
+
+@payments_cli.command('unmatched')
+def list_unmatched_events():
+    """List paid orders the webhook could not finalize (no buyer on record)."""
+    rows = orders.unmatched_events()
+    for event, pending in rows:
+        amount = f"{pending.amount_paise} paise, {pending.source}" if pending else "no ledger row"
+        click.echo(f"{event.razorpay_order_id}  {event.razorpay_payment_id}  received {event.received_at:%Y-%m-%d %H:%M}"
+                   f"  ({amount})")
+    click.echo(f"{len(rows)} unmatched events.")
+
+
+@analytics_cli.command('rebuild')
+def rebuild_rollups():
+    """Recompute the sales rollups from orders_history (backfill)."""
+    daily, users = analytics.rebuild()
+    click.echo(f"Done, {daily} daily rows and {users} user rows written.")
+
+
+@search_cli.command('reindex')
+def reindex_products():
+    """Create the search index if missing and rebuild it from products."""
+    search.reindex()
+    catalog_cache.invalidate()
+    click.echo("Done, search index rebuilt.")
+
+
+def register_commands(app):
+    app.cli.add_command(images_cli)
+    app.cli.add_command(tokens_cli)
+    app.cli.add_command(payments_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(search_cli)
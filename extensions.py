@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 import os
 
-db = SQLAlchemy()
+from services.db_routing import RoutingSession
+
+# RoutingSession sends reads of @read_only views to the replica bind, if any
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Use Render PostgreSQL (set in environment variable)
 DATABASE_URL = os.environ.get("DATABASE_URL") or \
@@ -0,0 +1,44 @@
+"""gunicorn settings for wsgi:app.
+
+The app is imported once in the master (preload_app) and forked into the
+workers; nothing at import touches the database, so a restart is bounded by
+the import time. Each worker discards inherited DB pools, and with WARMUP=1
+warms up before it accepts requests. Boot timings are logged at INFO.
+"""
+import multiprocessing
+import os
+import time
+
+_started = time.monotonic()  # this file is read as the master starts
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+preload_app = True
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # e.g. "-" for stdout
+
+
+def when_ready(server):
+    server.log.info("Master ready in %.3fs (app preloaded)", time.monotonic() - _started)
+
+
+def post_fork(server, worker):
+    from services import startup
+
+    app = worker.app.wsgi()
+    startup.after_fork(app)
+    if app.config['WARMUP']:
+        try:
+            server.log.info("Worker %s warmed up in %.3fs", worker.pid, startup.warm_up(app))
+        except Exception:
+            # serve anyway; the first requests just pay the cost
+            server.log.exception("Worker %s warmup failed", worker.pid)
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s accepting requests %.3fs after master start", worker.pid,
+                    time.monotonic() - _started)
@@ -0,0 +1,43 @@
+"""Add pending_orders ledger and Razorpay ids on orders_history
+
+Revision ID: 061c96761eaf
+Revises: 65bdd431f87b
+Create Date: 2026-10-17 11:20:54.207319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '061c96761eaf'
+down_revision = '65bdd431f87b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pending_orders',
+    sa.Column('razorpay_order_id', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('source', sa.String(length=10), nullable=False),
+    sa.Column('lines', sa.JSON(), nullable=False),
+    sa.Column('amount_paise', sa.Integer(), nullable=False),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('address', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('razorpay_order_id')
+    )
+    with op.batch_alter_table('orders_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('razorpay_order_id', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('razorpay_payment_id', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_orders_history_razorpay_order_id'), ['razorpay_order_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders_history', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_orders_history_razorpay_order_id'))
+        batch_op.drop_column('razorpay_payment_id')
+        batch_op.drop_column('razorpay_order_id')
+
+    op.drop_table('pending_orders')
@@ -0,0 +1,60 @@
+"""Add product full-text search
+
+Revision ID: 189e09083ff6
+Revises: 5b358aaf6b3e
+Create Date: 2026-10-17 13:58:12.402917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '189e09083ff6'
+down_revision = '5b358aaf6b3e'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = """
+    ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(line_description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(benefit, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(details, '')), 'C')
+    ) STORED
+"""
+
+PG_INDEXES = [
+    ('ix_products_search_vector', 'products USING GIN (search_vector)'),
+    ('ix_products_name_prefix', "products USING GIN (to_tsvector('simple', name))"),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # the generated column rewrites products once; the GIN indexes are
+        # then built without blocking writes
+        op.execute(SEARCH_VECTOR)
+        with op.get_context().autocommit_block():
+            for name, target in PG_INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+                op.execute(f'CREATE INDEX CONCURRENTLY {name} ON {target}')
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+            "name, line_description, benefit, details, prefix='2 3')"
+        )
+        op.execute(
+            "INSERT INTO product_search (rowid, name, line_description, benefit, details) "
+            "SELECT id, name, line_description, benefit, details FROM products"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, _ in PG_INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        op.execute('ALTER TABLE products DROP COLUMN IF EXISTS search_vector')
+    else:
+        op.execute('DROP TABLE IF EXISTS product_search')
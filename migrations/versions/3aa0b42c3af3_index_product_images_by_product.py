@@ -0,0 +1,40 @@
+"""Index product_images by product
+
+Revision ID: 3aa0b42c3af3
+Revises: 189e09083ff6
+Create Date: 2026-10-17 15:06:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3aa0b42c3af3'
+down_revision = '189e09083ff6'
+branch_labels = None
+depends_on = None
+
+# (product_id, id) serves both the catalog's ordered image lookup and the
+# cart summary's first-image MIN(id) per product.
+NAME = 'ix_product_images_product_id'
+COLUMNS = 'product_id, id'
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # built without blocking writes; drop first in case an earlier
+        # concurrent build failed and left an INVALID index
+        with op.get_context().autocommit_block():
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {NAME}')
+            op.execute(f'CREATE INDEX CONCURRENTLY {NAME} ON product_images ({COLUMNS})')
+    else:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {NAME} ON product_images ({COLUMNS})')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {NAME}')
+    else:
+        op.execute(f'DROP INDEX IF EXISTS {NAME}')
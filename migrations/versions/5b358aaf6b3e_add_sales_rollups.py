@@ -0,0 +1,53 @@
+"""Add sales_daily_rollup and user_sales_rollup
+
+Revision ID: 5b358aaf6b3e
+Revises: 82373f2349f5
+Create Date: 2026-10-17 13:21:40.118274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b358aaf6b3e'
+down_revision = '82373f2349f5'
+branch_labels = None
+depends_on = None
+
+# Tables start empty: backfill with `flask analytics rebuild` after upgrading.
+
+
+def upgrade():
+    op.create_table('sales_daily_rollup',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue_paise', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('product_id', 'day')
+    )
+    with op.batch_alter_table('sales_daily_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_sales_daily_rollup_day', ['day'], unique=False)
+
+    op.create_table('user_sales_rollup',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue_paise', sa.BigInteger(), nullable=False),
+    sa.Column('first_purchase_at', sa.DateTime(), nullable=True),
+    sa.Column('last_purchase_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('user_sales_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_user_sales_rollup_revenue', ['revenue_paise'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_sales_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_sales_rollup_revenue')
+
+    op.drop_table('user_sales_rollup')
+    with op.batch_alter_table('sales_daily_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_daily_rollup_day')
+
+    op.drop_table('sales_daily_rollup')
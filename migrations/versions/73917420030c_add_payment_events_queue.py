@@ -0,0 +1,41 @@
+"""Add payment_events webhook queue
+
+Revision ID: 73917420030c
+Revises: 061c96761eaf
+Create Date: 2026-10-17 12:02:16.873305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '73917420030c'
+down_revision = '061c96761eaf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('payment_events',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('event_id', sa.String(length=64), nullable=False),
+    sa.Column('event', sa.String(length=64), nullable=True),
+    sa.Column('razorpay_order_id', sa.String(length=64), nullable=True),
+    sa.Column('razorpay_payment_id', sa.String(length=64), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('received_at', sa.DateTime(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('event_id')
+    )
+    with op.batch_alter_table('payment_events', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_payment_events_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment_events', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payment_events_status'))
+
+    op.drop_table('payment_events')
@@ -0,0 +1,78 @@
+"""Index cart and orders_history; one cart line per user and product
+
+Revision ID: 82373f2349f5
+Revises: 73917420030c
+Create Date: 2026-10-17 12:48:05.661930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '82373f2349f5'
+down_revision = '73917420030c'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # (name, table, columns, unique)
+    ('ix_orders_history_user_date', 'orders_history', 'user_id, purchase_date DESC', False),
+    ('ix_orders_history_purchase_date', 'orders_history', 'purchase_date', False),
+    ('uq_cart_user_product', 'cart', 'user_id, product_id', True),
+]
+
+# Fold duplicate cart lines into the oldest one so the unique index can be built.
+MERGE_DUPLICATE_CART_LINES = [
+    """
+    UPDATE cart SET quantity = (
+        SELECT SUM(c2.quantity) FROM cart c2
+        WHERE c2.user_id = cart.user_id AND c2.product_id = cart.product_id
+    )
+    WHERE id IN (
+        SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1
+    )
+    """,
+    """
+    DELETE FROM cart WHERE id NOT IN (
+        SELECT MIN(id) FROM cart GROUP BY user_id, product_id
+    )
+    """,
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # The merge is one transaction, with cart writes blocked (reads
+        # aren't), so a failure or a concurrent add can't leave quantities
+        # summed into one line while the duplicates still exist.
+        op.execute('LOCK TABLE cart IN SHARE ROW EXCLUSIVE MODE')
+        for statement in MERGE_DUPLICATE_CART_LINES:
+            op.execute(statement)
+        # CONCURRENTLY builds the indexes without blocking writes; it can't
+        # run inside a transaction, hence the autocommit block, which first
+        # commits the merge. A failed concurrent build (e.g. a duplicate cart
+        # line added in between) leaves an INVALID index behind, so drop
+        # first to make the migration re-runnable.
+        with op.get_context().autocommit_block():
+            for name, table, columns, unique in INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+                op.execute(
+                    f'CREATE {"UNIQUE " if unique else ""}INDEX CONCURRENTLY {name} ON {table} ({columns})'
+                )
+    else:
+        for statement in MERGE_DUPLICATE_CART_LINES:
+            op.execute(statement)
+        for name, table, columns, unique in INDEXES:
+            op.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, _, _, _ in INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    else:
+        for name, _, _, _ in INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
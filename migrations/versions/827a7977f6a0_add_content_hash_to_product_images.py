@@ -0,0 +1,32 @@
+"""Add content_hash to product_images and allow image_data to be NULL
+
+Revision ID: 827a7977f6a0
+Revises: dfbf962b3939
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '827a7977f6a0'
+down_revision = 'dfbf962b3939'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.alter_column('image_data', existing_type=sa.LargeBinary(), nullable=True)
+        batch_op.create_index(batch_op.f('ix_product_images_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    # rows moved to the image store have no blob left; they must be moved
+    # back before image_data can be made NOT NULL again
+    with op.batch_alter_table('product_images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_images_content_hash'))
+        batch_op.alter_column('image_data', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,55 @@
+"""Add product stock and stock_reservations
+
+Revision ID: 8653d33eb4bf
+Revises: 3aa0b42c3af3
+Create Date: 2026-10-17 16:48:02.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8653d33eb4bf'
+down_revision = '3aa0b42c3af3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('hold_id', sa.String(length=32), nullable=False),
+    sa.Column('razorpay_order_id', sa.String(length=64), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_reservations_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_reservations_hold_id'), ['hold_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_reservations_razorpay_order_id'), ['razorpay_order_id'], unique=False)
+
+    # nullable, no default: existing products stay untracked and the
+    # ALTER doesn't rewrite the table
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('pending_orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reserved_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('pending_orders', schema=None) as batch_op:
+        batch_op.drop_column('reserved_until')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('stock')
+
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_razorpay_order_id'))
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_hold_id'))
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_expires_at'))
+
+    op.drop_table('stock_reservations')
@@ -0,0 +1,27 @@
+from extensions import db
+
+# ---- Models ----
+# Aggregates of orders_history, kept current by services/analytics.py as
+# orders are written. Money is in integer paise.
+class SalesDailyRollup(db.Model):
+    __tablename__ = "sales_daily_rollup"
+    __table_args__ = (
+        db.Index("ix_sales_daily_rollup_day", "day"),
+    )
+    product_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC day of purchase_date
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue_paise = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class UserSalesRollup(db.Model):
+    __tablename__ = "user_sales_rollup"
+    __table_args__ = (
+        db.Index("ix_user_sales_rollup_revenue", "revenue_paise"),
+    )
+    user_id = db.Column(db.Integer, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue_paise = db.Column(db.BigInteger, nullable=False, default=0)
+    first_purchase_at = db.Column(db.DateTime, nullable=True)
+    last_purchase_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,31 @@
+from extensions import db
+
+# ---- Models ----
+class User(db.Model):
+    __tablename__ = "users"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    username = db.Column(db.String(150), unique=True, nullable=False)
+    email = db.Column(db.String(255), unique=True, nullable=False)
+    password = db.Column(db.String(255), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=True)
+    address = db.Column(db.String(255), nullable=True)
+
+    tokens = db.relationship("Token", backref="user", cascade="all, delete-orphan")
+
+
+class Token(db.Model):
+    # opaque session tokens issued before signed tokens; only read until they expire
+    __tablename__ = "tokens"
+
+    token = db.Column(db.String(255), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class RevokedToken(db.Model):
+    # signed tokens logged out before their expiry (see services/tokens.py)
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
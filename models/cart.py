@@ -0,0 +1,70 @@
+import datetime
+
+from extensions import db
+
+# ---- Models ----
+class Cart(db.Model):
+    __tablename__ = "cart"
+    __table_args__ = (
+        # one line per product per user; POST /cart merges quantities into it
+        db.Index("uq_cart_user_product", "user_id", "product_id", unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    product_name = db.Column(db.String(255), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+class OrdersHistory(db.Model):
+    __tablename__ = "orders_history"
+    __table_args__ = (
+        db.Index("ix_orders_history_user_date", "user_id", db.text("purchase_date DESC")),
+        db.Index("ix_orders_history_purchase_date", "purchase_date"),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    product_name = db.Column(db.String(255), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price_at_purchase = db.Column(db.Float, nullable=False)
+    purchase_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    phone_number = db.Column(db.String(20), nullable=True)
+    address = db.Column(db.String(255), nullable=True)
+    razorpay_order_id = db.Column(db.String(64), nullable=True, index=True)
+    razorpay_payment_id = db.Column(db.String(64), nullable=True)
+
+class PendingOrder(db.Model):
+    # priced lines of a Razorpay order awaiting payment (see services/orders.py)
+    __tablename__ = "pending_orders"
+    razorpay_order_id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    source = db.Column(db.String(10), nullable=False)  # "cart" or "item"
+    lines = db.Column(db.JSON, nullable=False)
+    amount_paise = db.Column(db.Integer, nullable=False)
+    phone_number = db.Column(db.String(20), nullable=True)
+    address = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    reserved_until = db.Column(db.DateTime, nullable=True)  # stock held for this order until then
+
+class StockReservation(db.Model):
+    # stock taken by an unpaid checkout, returned if it expires (see services/inventory.py)
+    __tablename__ = "stock_reservations"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    hold_id = db.Column(db.String(32), nullable=False, index=True)
+    razorpay_order_id = db.Column(db.String(64), nullable=True, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class PaymentEvent(db.Model):
+    # verified Razorpay webhook deliveries, drained by services/orders.py
+    __tablename__ = "payment_events"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_id = db.Column(db.String(64), nullable=False, unique=True)
+    event = db.Column(db.String(64), nullable=True)
+    razorpay_order_id = db.Column(db.String(64), nullable=True)
+    razorpay_payment_id = db.Column(db.String(64), nullable=True)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending", index=True)  # pending, done, unmatched, duplicate, ignored
+    received_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
@@ -10,14 +10,23 @@ class Product(db.Model):
     details = db.Column(db.Text)
     line_description = db.Column(db.Text)
     benefit = db.Column(db.Text)
+    # units left to sell, NULL if not tracked. Only changed by single
+    # conditional UPDATEs (see services/inventory.py), never read-modify-write
+    stock = db.Column(db.Integer, nullable=True)
 
     images = db.relationship("ProductImage", backref="product", cascade="all, delete-orphan")
 
 
 class ProductImage(db.Model):
     __tablename__ = "product_images"
+    __table_args__ = (
+        db.Index("ix_product_images_product_id", "product_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
-    image_data = db.Column(db.LargeBinary, nullable=False)   # store actual image binary
+    # deferred: only loaded when an image is actually served. NULL once the
+    # bytes live in the image store (see services/image_store.py)
+    image_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    content_hash = db.Column(db.String(64), index=True)  # sha256 of the image bytes
     mimetype = db.Column(db.String(50))  # e.g. "image/jpeg", "image/png"
\ No newline at end of file
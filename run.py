@@ -4,18 +4,20 @@ import os
 from flask import Flask
 from app import create_app
 from api.cart import db  # import db and Postgres URL
-from extensions import DATABASE_URL
+from services import search
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-app = create_app()
+# The local dev server runs in debug mode, where create_app() accepts a
+# missing SECRET_KEY (and uses a throwaway one). FLASK_DEBUG from the shell
+# or .env (loaded by app.py) still wins.
+os.environ.setdefault('FLASK_DEBUG', '1')
 
-# Configure DB
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app = create_app()
 
 # Create tables in Postgres (only if they don't exist)
 with app.app_context():
     db.create_all()
+    search.install()  # search column/indexes aren't part of the models
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
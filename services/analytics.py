@@ -0,0 +1,226 @@
+import datetime
+
+from extensions import db
+from models.analytics import SalesDailyRollup, UserSalesRollup
+from models.cart import OrdersHistory
+from models.product import Product
+from services.pricing import to_paise
+from services.sql import greatest, least, upsert_insert
+
+# Sales analytics read from two rollup tables instead of orders_history:
+# units/revenue per product per day, and lifetime totals per user. They are
+# updated by record_sales() in the same transaction that writes the order
+# rows, so they never drift; rebuild() recomputes them from scratch for the
+# initial backfill or after orders_history is edited by hand.
+
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+
+class AnalyticsQueryError(ValueError):
+    pass
+
+
+def _parse_date(name, value):
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise AnalyticsQueryError(f'{name} must be an ISO date (YYYY-MM-DD)')
+
+
+def parse_range(args):
+    """since/until as dates; until is inclusive."""
+    since = _parse_date('since', args.get('since'))
+    until = _parse_date('until', args.get('until'))
+    if since and until and since > until:
+        raise AnalyticsQueryError('since must not be after until')
+    return since, until
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_TOP
+    try:
+        limit = int(value)
+    except ValueError:
+        raise AnalyticsQueryError('limit must be an integer')
+    if not 1 <= limit <= MAX_TOP:
+        raise AnalyticsQueryError(f'limit must be between 1 and {MAX_TOP}')
+    return limit
+
+
+# ---- Maintenance ----
+
+def record_sales(rows, session=None):
+    """Fold freshly inserted OrdersHistory rows (dicts) into the rollups.
+
+    Runs in the caller's transaction. Each rollup row is bumped with an
+    atomic ON CONFLICT increment, so concurrent writers never lose updates;
+    keys are upserted in sorted order to avoid deadlocks between them.
+    """
+    if not rows:
+        return
+    session = session or db.session
+    daily = {}
+    users = {}
+    for row in rows:
+        revenue = to_paise(row['price_at_purchase']) * row['quantity']
+        key = (row['product_id'], row['purchase_date'].date())
+        units, total = daily.get(key, (0, 0))
+        daily[key] = (units + row['quantity'], total + revenue)
+
+        user = users.setdefault(row['user_id'], {
+            'orders': set(), 'units': 0, 'revenue_paise': 0,
+            'first': row['purchase_date'], 'last': row['purchase_date'],
+        })
+        user['orders'].add(row['razorpay_order_id'])
+        user['units'] += row['quantity']
+        user['revenue_paise'] += revenue
+        user['first'] = min(user['first'], row['purchase_date'])
+        user['last'] = max(user['last'], row['purchase_date'])
+
+    stmt = upsert_insert(SalesDailyRollup, session)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SalesDailyRollup.product_id, SalesDailyRollup.day],
+        set_={
+            'units': SalesDailyRollup.units + stmt.excluded.units,
+            'revenue_paise': SalesDailyRollup.revenue_paise + stmt.excluded.revenue_paise,
+        },
+    )
+    session.execute(stmt, [
+        {'product_id': product_id, 'day': day, 'units': units, 'revenue_paise': revenue}
+        for (product_id, day), (units, revenue) in sorted(daily.items())
+    ])
+
+    stmt = upsert_insert(UserSalesRollup, session)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserSalesRollup.user_id],
+        set_={
+            'orders': UserSalesRollup.orders + stmt.excluded.orders,
+            'units': UserSalesRollup.units + stmt.excluded.units,
+            'revenue_paise': UserSalesRollup.revenue_paise + stmt.excluded.revenue_paise,
+            # a late finalize (webhook drained after a newer verify) may carry
+            # older purchases, so the bounds are merged as rebuild() computes them
+            'first_purchase_at': least(UserSalesRollup.first_purchase_at, stmt.excluded.first_purchase_at,
+                                       session=session),
+            'last_purchase_at': greatest(UserSalesRollup.last_purchase_at, stmt.excluded.last_purchase_at,
+                                         session=session),
+        },
+    )
+    session.execute(stmt, [
+        {
+            'user_id': user_id,
+            'orders': len(user['orders']),
+            'units': user['units'],
+            'revenue_paise': user['revenue_paise'],
+            'first_purchase_at': user['first'],
+            'last_purchase_at': user['last'],
+        }
+        for user_id, user in sorted(users.items())
+    ])
+
+
+def rebuild():
+    """Recompute both rollups from orders_history and commit.
+
+    Returns (daily rows, user rows). On Postgres the rollup tables are locked
+    for the duration, so orders finalized meanwhile wait and are counted once.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(db.text('LOCK TABLE sales_daily_rollup, user_sales_rollup IN EXCLUSIVE MODE'))
+    db.session.execute(db.delete(SalesDailyRollup))
+    db.session.execute(db.delete(UserSalesRollup))
+
+    revenue = db.cast(db.func.round(OrdersHistory.price_at_purchase * 100), db.BigInteger) * OrdersHistory.quantity
+    day = db.func.date(OrdersHistory.purchase_date)
+    daily = db.session.execute(db.insert(SalesDailyRollup).from_select(
+        ['product_id', 'day', 'units', 'revenue_paise'],
+        db.select(OrdersHistory.product_id, day, db.func.sum(OrdersHistory.quantity), db.func.sum(revenue))
+        .group_by(OrdersHistory.product_id, day),
+    )).rowcount
+
+    # rows written before orders had a Razorpay id were one order each
+    orders = (
+        db.func.count(db.distinct(OrdersHistory.razorpay_order_id))
+        + db.func.sum(db.case((OrdersHistory.razorpay_order_id.is_(None), 1), else_=0))
+    )
+    users = db.session.execute(db.insert(UserSalesRollup).from_select(
+        ['user_id', 'orders', 'units', 'revenue_paise', 'first_purchase_at', 'last_purchase_at'],
+        db.select(
+            OrdersHistory.user_id, orders, db.func.sum(OrdersHistory.quantity), db.func.sum(revenue),
+            db.func.min(OrdersHistory.purchase_date), db.func.max(OrdersHistory.purchase_date),
+        ).group_by(OrdersHistory.user_id),
+    )).rowcount
+    db.session.commit()
+    return daily, users
+
+
+# ---- Queries ----
+
+def _in_range(stmt, since, until):
+    if since:
+        stmt = stmt.where(SalesDailyRollup.day >= since)
+    if until:
+        stmt = stmt.where(SalesDailyRollup.day <= until)
+    return stmt
+
+
+def top_products(since=None, until=None, limit=DEFAULT_TOP, by='revenue'):
+    units = db.func.sum(SalesDailyRollup.units).label('units')
+    revenue = db.func.sum(SalesDailyRollup.revenue_paise).label('revenue_paise')
+    stmt = _in_range(
+        db.select(SalesDailyRollup.product_id, Product.name, units, revenue)
+        .outerjoin(Product, Product.id == SalesDailyRollup.product_id)
+        .group_by(SalesDailyRollup.product_id, Product.name),
+        since, until,
+    )
+    order = units if by == 'units' else revenue
+    stmt = stmt.order_by(order.desc(), SalesDailyRollup.product_id).limit(limit)
+    return [
+        {'product_id': product_id, 'product_name': name, 'units': int(units), 'revenue_paise': int(revenue)}
+        for product_id, name, units, revenue in db.session.execute(stmt)
+    ]
+
+
+def daily_revenue(since=None, until=None, product_id=None):
+    stmt = _in_range(
+        db.select(
+            SalesDailyRollup.day,
+            db.func.sum(SalesDailyRollup.units),
+            db.func.sum(SalesDailyRollup.revenue_paise),
+        ).group_by(SalesDailyRollup.day).order_by(SalesDailyRollup.day),
+        since, until,
+    )
+    if product_id is not None:
+        stmt = stmt.where(SalesDailyRollup.product_id == product_id)
+    return [
+        {'day': day.isoformat(), 'units': int(units), 'revenue_paise': int(revenue)}
+        for day, units, revenue in db.session.execute(stmt)
+    ]
+
+
+def _user(rollup):
+    return {
+        'user_id': rollup.user_id,
+        'orders': rollup.orders,
+        'units': rollup.units,
+        'revenue_paise': rollup.revenue_paise,
+        'first_purchase_at': rollup.first_purchase_at.isoformat() if rollup.first_purchase_at else None,
+        'last_purchase_at': rollup.last_purchase_at.isoformat() if rollup.last_purchase_at else None,
+    }
+
+
+def lifetime_value(user_id):
+    rollup = db.session.get(UserSalesRollup, user_id)
+    return _user(rollup) if rollup else None
+
+
+def top_customers(limit=DEFAULT_TOP):
+    rollups = db.session.execute(
+        db.select(UserSalesRollup)
+        .order_by(UserSalesRollup.revenue_paise.desc(), UserSalesRollup.user_id)
+        .limit(limit)
+    ).scalars()
+    return [_user(r) for r in rollups]
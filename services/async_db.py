@@ -0,0 +1,80 @@
+from flask import current_app
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Async sessions on the primary database for the async checkout app
+# (asyncpg for Postgres, aiosqlite for SQLite). Service functions written
+# against a sync Session run on them through AsyncSession.run_sync, so the
+# SQL is shared with the Flask views while every round trip is awaited.
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_url(url):
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver for {url.get_backend_name()}")
+    url = url.set(drivername=driver)
+    if 'sslmode' in url.query:
+        # libpq spelling; asyncpg calls it ssl
+        url = url.update_query_dict({'ssl': url.query['sslmode']}).difference_update_query(['sslmode'])
+    return url
+
+
+def async_engine_options(options):
+    """SQLALCHEMY_ENGINE_OPTIONS with libpq connect_args translated for asyncpg."""
+    options = dict(options)
+    libpq_options = options.pop('connect_args', {}).get('options', '')
+    settings = {}
+    for setting in libpq_options.split('-c '):
+        if '=' in setting:
+            name, value = setting.split('=', 1)
+            settings[name.strip()] = value.strip()
+    if settings:
+        options['connect_args'] = {'server_settings': settings}
+    return options
+
+
+class AsyncDatabase:
+    """Builds the engine on first use, inside the event loop that will own it."""
+
+    def __init__(self, url, engine_options):
+        self.url = url
+        self.engine_options = engine_options
+        self._engine = None
+        self._sessions = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = create_async_engine(async_url(self.url), **async_engine_options(self.engine_options))
+            self._sessions = async_sessionmaker(self._engine, class_=AsyncSession, expire_on_commit=False)
+        return self._engine
+
+    def session(self):
+        self.engine
+        return self._sessions()
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+async def run(session, fn, *args, **kwargs):
+    """Await a sync service function, handing it the session's sync facade."""
+    return await session.run_sync(lambda sync_session: fn(*args, session=sync_session, **kwargs))
+
+
+def init_app(app):
+    app.extensions['async_db'] = AsyncDatabase(
+        app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    )
+
+
+def get_async_db():
+    return current_app.extensions['async_db']
@@ -0,0 +1,43 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs ``fn()`` every ``interval`` seconds on a daemon thread, inside an app context.
+
+    Threads do not survive fork, so start() is safe to call on every request:
+    it starts the thread once per process.
+    """
+
+    def __init__(self, name, interval, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self, app):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            thread = threading.Thread(target=self._loop, args=(app,), name=self.name, daemon=True)
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, app):
+        while not self._stop.wait(self.interval):
+            try:
+                with app.app_context():
+                    self.fn()
+            except Exception:
+                logger.exception("Background task %s failed", self.name)
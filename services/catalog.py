@@ -0,0 +1,110 @@
+from extensions import db
+from models.product import Product, ProductImage
+from services.serializers import PRODUCT, PRODUCT_IMAGE
+
+# Catalog read path. Every call runs at most two statements: one for the
+# product rows (only the requested columns) and one batched lookup of image
+# ids. ProductImage.image_data is never selected here.
+
+ALL_FIELDS = set(PRODUCT.fields) | {'images'}
+
+LIST_FIELDS = ('id', 'name', 'prize', 'details', 'images')
+DETAIL_FIELDS = ('id', 'name', 'prize', 'details', 'benefit', 'line_description', 'images')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class CatalogQueryError(ValueError):
+    pass
+
+
+def parse_fields(raw, default):
+    if not raw:
+        return default
+    fields = tuple(f.strip() for f in raw.split(',') if f.strip())
+    unknown = [f for f in fields if f not in ALL_FIELDS]
+    if unknown:
+        raise CatalogQueryError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_page(after, limit):
+    try:
+        after = int(after) if after is not None else None
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        raise CatalogQueryError('after and limit must be integers')
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise CatalogQueryError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    if after is not None and limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    return after, limit
+
+
+def image_url(image_id):
+    return f"/product_images/{image_id}"
+
+
+def image_ids_by_product(product_ids):
+    """Map product id -> ordered image ids with one query, without blobs."""
+    images = {pid: [] for pid in product_ids}
+    if not product_ids:
+        return images
+    rows = db.session.execute(
+        PRODUCT_IMAGE.only('id', 'product_id').select()
+        .where(ProductImage.product_id.in_(product_ids))
+        .order_by(ProductImage.product_id, ProductImage.id)
+    )
+    for image_id, product_id in rows:
+        images[product_id].append(image_id)
+    return images
+
+
+def _serialize(rows, fields):
+    result = PRODUCT.only(*[f for f in fields if f != 'images']).dump_many(rows)
+    if 'images' in fields:
+        images = image_ids_by_product([row.id for row in rows])
+        for row, item in zip(rows, result):
+            item['images'] = [image_url(i) for i in images[row.id]]
+    return result
+
+
+def _select(fields):
+    # id is always loaded: it is the keyset cursor and the image join key
+    names = ['id'] + [f for f in fields if f in PRODUCT.fields and f != 'id']
+    return PRODUCT.only(*names).select()
+
+
+def list_products(fields=LIST_FIELDS, after=None, limit=None):
+    """Return (items, next_after). next_after is None on the last page."""
+    stmt = _select(fields).order_by(Product.id)
+    if after is not None:
+        stmt = stmt.where(Product.id > after)
+    if limit is not None:
+        # fetch one extra row to know whether another page exists
+        stmt = stmt.limit(limit + 1)
+
+    rows = db.session.execute(stmt).all()
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1].id
+    return _serialize(rows, fields), next_after
+
+
+def get_products_by_ids(product_ids, fields=LIST_FIELDS):
+    """Load several products in the given id order, skipping missing ids."""
+    if not product_ids:
+        return []
+    rows = db.session.execute(_select(fields).where(Product.id.in_(product_ids))).all()
+    by_id = {row.id: row for row in rows}
+    ordered = [by_id[pid] for pid in product_ids if pid in by_id]
+    return _serialize(ordered, fields)
+
+
+def get_product(product_id, fields=DETAIL_FIELDS):
+    row = db.session.execute(_select(fields).where(Product.id == product_id)).first()
+    if row is None:
+        return None
+    return _serialize([row], fields)[0]
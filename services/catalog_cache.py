@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from services import db_routing
+from services.shared_version import SharedVersion
+
+logger = logging.getLogger(__name__)
+
+# Pre-serialized catalog responses, per worker process. Entries are tagged
+# with the shared catalog version; a write handler bumps the version and
+# every worker sees its entries go stale on the next read.
+
+CACHED_HEADERS = ('X-Next-After', 'X-Next-Offset')
+
+
+class _Entry:
+    __slots__ = ('status', 'body', 'headers', 'version', 'stored_at', 'size')
+
+    def __init__(self, status, body, headers, version):
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.version = version
+        self.stored_at = time.monotonic()
+        self.size = len(body)
+
+
+class CatalogCache:
+    def __init__(self, version, max_bytes, ttl, stale_ttl):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'stale_errors': 0, 'evictions': 0}
+
+    def _lookup(self, key, version):
+        """Return (entry, fresh). Too-old entries are dropped."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            age = time.monotonic() - entry.stored_at
+            if age > self.stale_ttl:
+                self._remove(key)
+                return None, False
+            self._entries.move_to_end(key)
+            return entry, entry.version == version and age <= self.ttl
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def store(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+
+    def _claim_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _release_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def get_or_render(self, key, render):
+        """Serve ``key`` from cache, calling ``render(version) -> entry`` when needed.
+
+        A stale entry is served as-is while another thread refreshes it, or
+        when the refresh itself fails (e.g. the database is unavailable).
+        """
+        version = self.version.get()
+        entry, fresh = self._lookup(key, version)
+        if fresh:
+            self.stats['hits'] += 1
+            return entry
+        if entry is None:
+            self.stats['misses'] += 1
+            new_entry = render(version)
+            self.store(key, new_entry)
+            return new_entry
+
+        if not self._claim_refresh(key):
+            self.stats['stale_hits'] += 1
+            return entry
+        try:
+            new_entry = render(version)
+        except Exception:
+            logger.exception("Catalog refresh failed for %s, serving stale entry", key)
+            self.stats['stale_errors'] += 1
+            return entry
+        finally:
+            self._release_refresh(key)
+        self.store(key, new_entry)
+        self.stats['misses'] += 1
+        return new_entry
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes,
+                        max_bytes=self.max_bytes, version=self.version.get())
+
+
+def init_app(app):
+    os.makedirs(app.instance_path, exist_ok=True)
+    version_path = app.config.get('CATALOG_VERSION_PATH') or os.path.join(app.instance_path, 'catalog.version')
+    app.extensions['catalog_cache'] = CatalogCache(
+        SharedVersion(version_path),
+        max_bytes=app.config['CATALOG_CACHE_MAX_BYTES'],
+        ttl=app.config['CATALOG_CACHE_TTL'],
+        stale_ttl=app.config['CATALOG_CACHE_STALE_TTL'],
+    )
+
+
+def get_cache():
+    return current_app.extensions['catalog_cache']
+
+
+def invalidate():
+    """Call after committing any catalog write."""
+    get_cache().version.bump()
+
+
+def cached(view):
+    """Cache the JSON responses of a catalog GET view, keyed by full path.
+
+    4xx answers (unknown product, bad query) are cached too: they only change
+    when the catalog does. Server errors propagate and are never stored.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        def render(version):
+            if time.time() - get_cache().version.changed_at() < current_app.config['DB_REPLICA_MAX_LAG']:
+                # a replica may not have the change yet; don't cache its answer
+                db_routing.use_primary()
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code >= 500:
+                raise RuntimeError(f"{request.path} returned {response.status_code}")
+            headers = {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers}
+            return _Entry(response.status_code, response.get_data(), headers, version)
+
+        entry = get_cache().get_or_render(request.full_path, render)
+        response = current_app.response_class(entry.body, status=entry.status, mimetype='application/json')
+        response.headers.update(entry.headers)
+        return response
+
+    return wrapper
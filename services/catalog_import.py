@@ -0,0 +1,218 @@
+import csv
+import io
+import itertools
+import json
+import math
+import zipfile
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from models.product import Product, ProductImage
+from services import image_store, search
+
+# Bulk catalog import. The manifest (CSV with a header row, or JSON lines)
+# is read one row at a time and images are streamed from the zip only when
+# their row is inserted. Rows are written in batches: one flush inserts the
+# batch's products, a second its images, then one commit. A row that fails
+# validation is reported and skipped; a batch the database rejects is
+# reported row by row and the import carries on with the next batch.
+#
+# Resized variants are not generated inline: run `flask images variants`
+# after a large import.
+
+MANIFEST_FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 1000
+MAX_PRIZE = 10_000_000  # rupees; a price past this is a typo or a unit mix-up
+
+# manifest column -> Product attribute (lineDescription matches /upload)
+FIELD_ALIASES = {
+    'name': 'name',
+    'prize': 'prize',
+    'price': 'prize',
+    'details': 'details',
+    'line_description': 'line_description',
+    'lineDescription': 'line_description',
+    'benefit': 'benefit',
+}
+
+
+class CatalogImportError(ValueError):
+    pass
+
+
+class RowError(ValueError):
+    pass
+
+
+def manifest_format(filename, requested=None):
+    fmt = requested or filename.rsplit('.', 1)[-1].lower()
+    if fmt in ('json', 'ndjson'):
+        fmt = 'jsonl'
+    if fmt not in MANIFEST_FORMATS:
+        raise CatalogImportError('manifest must be .csv or .jsonl (or pass format=csv|jsonl)')
+    return fmt
+
+
+def _iter_rows(text, fmt):
+    if fmt == 'csv':
+        # row 1 is the header
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield number, RowError('each line must be a JSON object')
+            continue
+        yield number, row
+
+
+def iter_manifest(stream, fmt):
+    """Yield (row number, dict or RowError) without reading the whole file."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    number = 0
+    try:
+        for number, row in _iter_rows(text, fmt):
+            yield number, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        # the rest of the file can't be read reliably
+        yield number + 1, RowError(f'unreadable manifest, import stopped here: {e}')
+
+
+def _image_names(raw):
+    if raw is None or raw == '':
+        return []
+    if isinstance(raw, list):
+        return [str(n).strip() for n in raw if str(n).strip()]
+    return [n.strip() for n in str(raw).split(';') if n.strip()]
+
+
+def validate_row(row):
+    """Return (Product column values, image names) or raise RowError."""
+    values = {}
+    for key, value in row.items():
+        attr = FIELD_ALIASES.get(key)
+        if attr and value not in (None, ''):
+            values[attr] = value.strip() if isinstance(value, str) else value
+    missing = [f for f in ('name', 'prize', 'details') if f not in values]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+    try:
+        values['prize'] = float(values['prize'])
+    except (TypeError, ValueError):
+        raise RowError('prize must be a number')
+    if not math.isfinite(values['prize']):
+        raise RowError('prize must be a finite number')
+    if not 0 <= values['prize'] <= MAX_PRIZE:
+        raise RowError(f'prize must be between 0 and {MAX_PRIZE}')
+    if len(str(values['name'])) > 255:
+        raise RowError('name is longer than 255 characters')
+    return values, _image_names(row.get('images'))
+
+
+class ImageArchive:
+    """Random access to the images zip; one member is read at a time."""
+
+    def __init__(self, fileobj, max_image_bytes):
+        self.max_image_bytes = max_image_bytes
+        try:
+            self._zip = zipfile.ZipFile(fileobj) if fileobj else None
+        except zipfile.BadZipFile:
+            raise CatalogImportError('images must be a zip archive')
+        self._members = {}
+        if self._zip:
+            for info in self._zip.infolist():
+                if not info.is_dir():
+                    self._members[info.filename.lstrip('/')] = info
+
+    def check(self, names):
+        for name in names:
+            info = self._members.get(name.lstrip('/'))
+            if info is None:
+                raise RowError(f'image {name} not found in the archive')
+            if info.file_size > self.max_image_bytes:
+                raise RowError(f'image {name} is larger than {self.max_image_bytes} bytes')
+            with self._zip.open(info) as member:
+                if image_store.sniff_mimetype(member.read(image_store.SNIFF_BYTES)) is None:
+                    raise RowError(f'image {name} is not a JPEG, PNG, GIF or WebP')
+
+    def open(self, name):
+        return self._zip.open(self._members[name.lstrip('/')])
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write_batch(batch, archive, store):
+    products = [Product(**values) for _, values, _ in batch]
+    db.session.add_all(products)
+    db.session.flush()  # one INSERT for the batch, ids come back via RETURNING
+
+    images = []
+    for product, (_, _, names) in zip(products, batch):
+        for name in names:
+            img = ProductImage(product_id=product.id)
+            with archive.open(name) as member:
+                store.attach_stream(img, member)
+            images.append(img)
+    search.index_products(products)
+    db.session.add_all(images)
+    ids = [p.id for p in products]  # read before commit expires them
+    db.session.commit()
+    return ids, len(images)
+
+
+def run(manifest, fmt, archive, batch_size):
+    """Import every valid row; returns the report dict."""
+    store = image_store.get_store()
+    report = {'rows': 0, 'created': 0, 'images': 0, 'failed': 0, 'product_ids': [], 'errors': []}
+
+    def fail(number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'error': message})
+
+    def valid_rows():
+        for number, row in iter_manifest(manifest, fmt):
+            report['rows'] += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                values, names = validate_row(row)
+                archive.check(names)
+            except RowError as e:
+                fail(number, str(e))
+                continue
+            yield number, values, names
+
+    for batch in _batches(valid_rows(), batch_size):
+        try:
+            ids, image_count = _write_batch(batch, archive, store)
+        except (SQLAlchemyError, OSError, zipfile.BadZipFile, image_store.ImageRejected) as e:
+            db.session.rollback()
+            for number, _, _ in batch:
+                fail(number, f'batch rejected: {e.__class__.__name__}: {e}'[:500])
+            continue
+        report['created'] += len(ids)
+        report['images'] += image_count
+        report['product_ids'].extend(ids)
+
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    return report
@@ -0,0 +1,104 @@
+import math
+import time
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+# Read replica routing. Views marked @read_only run their SELECTs against
+# the "replica" bind (DATABASE_REPLICA_URL) when one is configured; flushes,
+# INSERT/UPDATE/DELETE and SELECT ... FOR UPDATE always go to the primary,
+# as does everything outside those views. After a client writes, its reads
+# are pinned to the primary for DB_REPLICA_MAX_LAG seconds so it sees its own
+# changes despite replication lag.
+#
+# The pin is a deadline (unix time) returned two ways after every write:
+# a SameSite=Lax cookie, which same-site clients send back on their own, and
+# an X-DB-Primary-Until response header (exposed through CORS). Browsers
+# don't send Lax cookies on cross-site fetch/XHR, so a storefront on another
+# origin must echo the header back on its next requests.
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_primary_until'
+PIN_HEADER = 'X-DB-Primary-Until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def engine_options(url, env):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``url`` from DB_* environment variables."""
+    options = {
+        'pool_pre_ping': env.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(env.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if not url.startswith('sqlite'):
+        options['pool_size'] = int(env.get('DB_POOL_SIZE', 5))
+        options['max_overflow'] = int(env.get('DB_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = float(env.get('DB_POOL_TIMEOUT', 10))
+    statement_timeout = int(env.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and url.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+def _is_write(clause):
+    if isinstance(clause, sa.sql.dml.UpdateBase):
+        return True
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+def _use_replica():
+    return has_request_context() and g.get('_db_use_replica', False)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not _use_replica() or self._flushing or _is_write(clause):
+            return engine
+        engines = self._db.engines
+        if engine is engines.get(None) and REPLICA in engines:
+            return engines[REPLICA]
+        return engine
+
+
+def _pinned():
+    now = time.time()
+    for value in (request.cookies.get(PIN_COOKIE), request.headers.get(PIN_HEADER)):
+        try:
+            if value and float(value) > now:
+                return True
+        except ValueError:
+            pass
+    return False
+
+
+def read_only(view):
+    """Route the view's reads to the replica, unless this client just wrote."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config.get('SQLALCHEMY_BINDS', {}).get(REPLICA) and not _pinned():
+            g._db_use_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def use_primary():
+    """Send the rest of this request's reads to the primary."""
+    g._db_use_replica = False
+
+
+def init_app(app):
+    if not app.config.get('SQLALCHEMY_BINDS', {}).get(REPLICA):
+        return
+
+    @app.after_request
+    def pin_after_write(response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            seconds = app.config['DB_REPLICA_MAX_LAG']
+            until = f'{time.time() + seconds:.3f}'
+            response.set_cookie(PIN_COOKIE, until, max_age=math.ceil(seconds), httponly=True, samesite='Lax')
+            response.headers[PIN_HEADER] = until
+        return response
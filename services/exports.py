@@ -0,0 +1,86 @@
+import csv
+import datetime
+import io
+
+from extensions import db
+from models.cart import OrdersHistory
+from services.serializers import ORDERS_HISTORY
+
+# Streaming export of orders_history. Rows come from a server-side cursor in
+# fixed-size partitions and are serialized one partition at a time, so memory
+# stays flat however many orders there are.
+
+EXPORT_COLUMNS = ORDERS_HISTORY.fields
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportQueryError(ValueError):
+    pass
+
+
+def _parse_datetime(name, value):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportQueryError(f'{name} must be an ISO date or datetime')
+
+
+def parse_filters(args):
+    filters = {}
+    if args.get('since'):
+        filters['since'] = _parse_datetime('since', args['since'])
+    if args.get('until'):
+        filters['until'] = _parse_datetime('until', args['until'])
+    if args.get('since_id'):
+        try:
+            filters['since_id'] = int(args['since_id'])
+        except ValueError:
+            raise ExportQueryError('since_id must be an integer')
+    return filters
+
+
+def apply_filters(stmt, filters):
+    if 'since' in filters:
+        stmt = stmt.where(OrdersHistory.purchase_date >= filters['since'])
+    if 'until' in filters:
+        stmt = stmt.where(OrdersHistory.purchase_date < filters['until'])
+    if 'since_id' in filters:
+        stmt = stmt.where(OrdersHistory.id > filters['since_id'])
+    return stmt
+
+
+def iter_partitions(filters, batch_size):
+    # ordered by id so an incremental pull can resume with since_id=<last id>
+    stmt = apply_filters(ORDERS_HISTORY.select().order_by(OrdersHistory.id), filters)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    yield from result.partitions()
+
+
+def ndjson_chunks(partitions):
+    for rows in partitions:
+        yield ORDERS_HISTORY.dumps_lines(rows)
+
+
+def csv_chunks(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in partitions:
+        writer.writerows(
+            [r.isoformat() if isinstance(r, datetime.datetime) else r for r in row] for row in rows
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream(fmt, filters, batch_size=1000):
+    partitions = iter_partitions(filters, batch_size)
+    if fmt == 'csv':
+        return csv_chunks(partitions)
+    return ndjson_chunks(partitions)
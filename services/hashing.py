@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Password hashing is deliberately slow, so it runs in a small process pool
+# instead of on the request thread. The number of hashes waiting or running
+# is capped; past the cap callers get HashingBusy (a 503) immediately.
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def normalize_method(method):
+    """Expand a werkzeug hash method to the prefix it writes, e.g. scrypt -> scrypt:32768:8:1."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2':
+        if not args:
+            args = ['sha256']
+        if len(args) == 1:
+            args.append(str(DEFAULT_PBKDF2_ITERATIONS))
+        return ':'.join([name] + args)
+    return method
+
+
+class HashingExecutor:
+    def __init__(self, method, max_workers, max_queue, timeout):
+        self.method = normalize_method(method)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._capacity = max_workers + max_queue
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'rejected': 0, 'timeouts': 0, 'in_flight': 0,
+                      'latency_sum': 0.0, 'latency_max': 0.0}
+
+    def _get_pool(self):
+        # pools are per process: a pool inherited through fork has no workers
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.stats['rejected'] += 1
+            raise HashingBusy()
+        with self._stats_lock:
+            self.stats['submitted'] += 1
+            self.stats['in_flight'] += 1
+        start = time.perf_counter()
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._finished(start)
+            raise
+        # the slot is freed when the job finishes, not when the caller stops
+        # waiting: a timed-out hash keeps its worker busy until it is done
+        future.add_done_callback(lambda _: self._finished(start))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()  # only helps if it hasn't started yet
+            with self._stats_lock:
+                self.stats['timeouts'] += 1
+            raise HashingBusy()
+
+    def _finished(self, start):
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.stats['in_flight'] -= 1
+            self.stats['latency_sum'] += elapsed
+            self.stats['latency_max'] = max(self.stats['latency_max'], elapsed)
+        self._slots.release()
+
+    def warm(self):
+        """Spawn the pool now instead of on the first login."""
+        self._get_pool().submit(int).result(timeout=self.timeout)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        completed = stats['submitted'] - stats['in_flight']
+        avg = stats['latency_sum'] / completed if completed else 0.0
+        return dict(stats, capacity=self._capacity, workers=self.max_workers,
+                    latency_avg=avg, method=self.method)
+
+
+def init_app(app):
+    app.extensions['password_hashing'] = HashingExecutor(
+        app.config['PASSWORD_HASH_METHOD'],
+        max_workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_queue=app.config['PASSWORD_HASH_QUEUE'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+
+
+def get_executor():
+    return current_app.extensions['password_hashing']
+
+
+def hash_password(password):
+    return get_executor().hash(password)
+
+
+def check_password(pwhash, password):
+    return get_executor().check(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    return get_executor().needs_rehash(pwhash)
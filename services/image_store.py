@@ -0,0 +1,250 @@
+import hashlib
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+
+from flask import current_app, send_file
+
+from extensions import db
+from models.product import ProductImage
+
+# Image URLs are keyed by ProductImage.id and a row's bytes never change
+# (update_product replaces rows), so responses can be cached for a year.
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+# uploads are copied in chunks of this size; an image is never held in
+# memory whole unless the database backend has to store it as a blob
+CHUNK_SIZE = 64 * 1024
+
+# leading bytes of the image formats accepted for upload
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+SNIFF_BYTES = 12
+
+
+class ImageRejected(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _immutable(response, max_age):
+    response.cache_control.immutable = max_age == CACHE_MAX_AGE
+    return response
+
+
+def sniff_mimetype(head):
+    """Image MIME type from the first SNIFF_BYTES of a file, or None."""
+    for signature, mimetype in SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def copy_image(stream, sink, max_bytes=None):
+    """Copy an uploaded image from ``stream`` to ``sink`` chunk by chunk.
+
+    Hashes and size-checks as it goes and rejects anything that isn't a
+    JPEG/PNG/GIF/WebP as soon as the first bytes arrive. Returns
+    (sha256 hex, mimetype).
+    """
+    digest = hashlib.sha256()
+    head = b''
+    mimetype = None
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise ImageRejected(f'Image is larger than {max_bytes} bytes', 413)
+        if mimetype is None and len(head) < SNIFF_BYTES:
+            head += chunk[:SNIFF_BYTES - len(head)]
+            if len(head) == SNIFF_BYTES:
+                mimetype = sniff_mimetype(head)
+                if mimetype is None:
+                    raise ImageRejected('Unsupported image type (use JPEG, PNG, GIF or WebP)')
+        digest.update(chunk)
+        sink(chunk)
+    if mimetype is None:
+        mimetype = sniff_mimetype(head)  # files shorter than SNIFF_BYTES
+        if mimetype is None:
+            raise ImageRejected('Unsupported image type (use JPEG, PNG, GIF or WebP)')
+    return digest.hexdigest(), mimetype
+
+
+class ImageStore(ABC):
+    """Where ProductImage bytes live. attach_stream() fills in a new row, send() serves it."""
+
+    max_bytes = None  # per-image cap enforced by attach_stream()
+
+    def attach(self, image, data):
+        self.attach_stream(image, io.BytesIO(data))
+
+    @abstractmethod
+    def attach_stream(self, image, stream):
+        """Store an uploaded image read from ``stream``; sets content_hash and mimetype."""
+
+    @abstractmethod
+    def send(self, image, max_age=CACHE_MAX_AGE):
+        """The response serving the image's bytes."""
+
+    def source(self, image):
+        """A path or file object with the original bytes, for Image.open()."""
+        return io.BytesIO(image.image_data)
+
+    def send_blob(self, image, max_age=CACHE_MAX_AGE):
+        # rows still holding their bytes in product_images.image_data
+        response = send_file(
+            io.BytesIO(image.image_data),
+            mimetype=image.mimetype,
+            etag=image.content_hash or False,
+            conditional=True,
+            max_age=max_age,
+        )
+        return _immutable(response, max_age)
+
+
+class DatabaseImageStore(ImageStore):
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+
+    def attach_stream(self, image, stream):
+        # the blob has to be in memory for the INSERT; max_bytes bounds it
+        data = bytearray()
+        image.content_hash, image.mimetype = copy_image(stream, data.extend, self.max_bytes)
+        image.image_data = bytes(data)
+
+    def send(self, image, max_age=CACHE_MAX_AGE):
+        return self.send_blob(image, max_age)
+
+
+class FilesystemImageStore(ImageStore):
+    """Content-addressed store: each distinct image is written once as <root>/ab/cd/<sha256>."""
+
+    def __init__(self, root, max_bytes=None):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, content_hash):
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def exists(self, content_hash):
+        return os.path.exists(self.path_for(content_hash))
+
+    def _publish(self, tmp_path, content_hash):
+        # rename into place, so readers never see a partially written object
+        path = self.path_for(content_hash)
+        if os.path.exists(path):
+            os.remove(tmp_path)  # identical upload, already stored
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    def _write_temp(self, write):
+        """Run ``write(file)`` against a temp file in the store; returns (path, result)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                result = write(f)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, result
+
+    def write(self, data):
+        content_hash = hashlib.sha256(data).hexdigest()
+        if self.exists(content_hash):
+            return content_hash
+        tmp_path, _ = self._write_temp(lambda f: f.write(data))
+        self._publish(tmp_path, content_hash)
+        return content_hash
+
+    def attach_stream(self, image, stream):
+        tmp_path, (content_hash, mimetype) = self._write_temp(
+            lambda f: copy_image(stream, f.write, self.max_bytes)
+        )
+        self._publish(tmp_path, content_hash)
+        image.content_hash = content_hash
+        image.mimetype = mimetype
+        image.image_data = None
+
+    def send(self, image, max_age=CACHE_MAX_AGE):
+        if image.content_hash and self.exists(image.content_hash):
+            response = send_file(
+                self.path_for(image.content_hash),
+                mimetype=image.mimetype,
+                etag=image.content_hash,
+                conditional=True,
+                max_age=max_age,
+            )
+            return _immutable(response, max_age)
+        # not migrated out of the database yet
+        return self.send_blob(image, max_age)
+
+    def source(self, image):
+        if image.content_hash and self.exists(image.content_hash):
+            return self.path_for(image.content_hash)
+        return super().source(image)
+
+
+def init_app(app):
+    backend = app.config['IMAGE_STORAGE_BACKEND']
+    if backend == 'filesystem':
+        store = FilesystemImageStore(app.config['IMAGE_STORE_PATH'], max_bytes=app.config['IMAGE_MAX_BYTES'])
+    elif backend == 'database':
+        store = DatabaseImageStore(max_bytes=app.config['IMAGE_MAX_BYTES'])
+    else:
+        raise ValueError(f"Unknown IMAGE_STORAGE_BACKEND: {backend}")
+    app.extensions['image_store'] = store
+
+
+def get_store():
+    return current_app.extensions['image_store']
+
+
+def migrate_blobs(store, batch_size=100, log=print):
+    """Move image_data blobs into ``store``, one row in memory at a time.
+
+    Rows are committed per batch and migrated rows have image_data cleared,
+    so an interrupted run simply picks up where it stopped.
+    """
+    moved = 0
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            db.select(ProductImage.id)
+            .where(ProductImage.id > last_id, ProductImage.image_data.isnot(None))
+            .order_by(ProductImage.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        for image_id in ids:
+            data = db.session.execute(
+                db.select(ProductImage.image_data).where(ProductImage.id == image_id)
+            ).scalar_one()
+            content_hash = store.write(data)
+            db.session.execute(
+                db.update(ProductImage)
+                .where(ProductImage.id == image_id)
+                .values(content_hash=content_hash, image_data=None)
+            )
+            del data
+
+        db.session.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+        log(f"Moved {moved} images (last id {last_id})")
+    return moved
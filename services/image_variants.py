@@ -0,0 +1,144 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Derivatives are keyed by the original's content hash, so identical uploads
+# share them and a row never needs to record which variants exist.
+FALLBACK_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+}
+WEBP = ('webp', 'image/webp')
+
+
+class VariantPipeline:
+    """Re-encodes originals to fixed widths (WebP plus JPEG/PNG) on a bounded thread pool."""
+
+    def __init__(self, root, widths, max_workers=2, max_pending=32, quality=80):
+        self.root = os.path.abspath(root)
+        self.widths = tuple(sorted(widths))
+        self.max_workers = max_workers
+        self.quality = quality
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='image-variants')
+            return self._executor
+
+    def path_for(self, content_hash, width, ext):
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}-w{width}.{ext}")
+
+    def pick_width(self, requested):
+        """Smallest configured width that covers ``requested``."""
+        for width in self.widths:
+            if width >= requested:
+                return width
+        return self.widths[-1]
+
+    def find(self, content_hash, requested, accept_webp):
+        """Return (path, mimetype, width) of a ready variant, or None."""
+        width = self.pick_width(requested)
+        candidates = [WEBP] if accept_webp else []
+        candidates += list(FALLBACK_FORMATS.values())
+        for ext, mimetype in candidates:
+            path = self.path_for(content_hash, width, ext)
+            if os.path.exists(path):
+                return path, mimetype, width
+        return None
+
+    def is_complete(self, content_hash):
+        return all(
+            os.path.exists(self.path_for(content_hash, width, WEBP[0]))
+            for width in self.widths
+        )
+
+    def submit(self, content_hash, source):
+        """Queue generation; returns False if the queue is full (backfill later)."""
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Image variant queue full, skipping %s", content_hash)
+            return False
+        future = self._get_executor().submit(self._run, content_hash, source)
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _run(self, content_hash, source):
+        try:
+            self.generate(content_hash, source)
+        except Exception:
+            logger.exception("Failed to generate variants for %s", content_hash)
+
+    def generate(self, content_hash, source):
+        if self.is_complete(content_hash):
+            return
+        with Image.open(source) as original:
+            original.load()
+            # apply EXIF orientation before the metadata is dropped
+            image = ImageOps.exif_transpose(original)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        fallback = 'PNG' if has_alpha else 'JPEG'
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for width in self.widths:
+            # never upscale; small originals are re-encoded at their own size
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            else:
+                resized = image
+            # no exif/icc/pnginfo is passed to save(), so metadata is stripped
+            self._save(resized, content_hash, width, WEBP[0], 'WEBP', quality=self.quality, method=4)
+            ext = FALLBACK_FORMATS[fallback][0]
+            if fallback == 'JPEG':
+                self._save(resized, content_hash, width, ext, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+            else:
+                self._save(resized, content_hash, width, ext, 'PNG', optimize=True)
+
+    def _save(self, image, content_hash, width, ext, fmt, **params):
+        path = self.path_for(content_hash, width, ext)
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, fmt, **params)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def init_app(app):
+    widths = [int(w) for w in app.config['IMAGE_VARIANT_WIDTHS'].split(',') if w.strip()]
+    app.extensions['image_variants'] = VariantPipeline(
+        app.config['IMAGE_VARIANT_PATH'],
+        widths,
+        max_workers=app.config['IMAGE_VARIANT_WORKERS'],
+        max_pending=app.config['IMAGE_VARIANT_QUEUE'],
+    )
+
+
+def get_pipeline():
+    return current_app.extensions['image_variants']
+
+
+def schedule(store, images):
+    """Queue variant generation for freshly committed ProductImage rows."""
+    pipeline = get_pipeline()
+    for image in images:
+        if image.content_hash and not pipeline.is_complete(image.content_hash):
+            pipeline.submit(image.content_hash, store.source(image))
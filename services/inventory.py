@@ -0,0 +1,218 @@
+import datetime
+import logging
+import uuid
+from collections import Counter, namedtuple
+
+from extensions import db
+from models.cart import StockReservation
+from models.product import Product
+from services.background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Stock is taken when a checkout starts, not when it is paid, so a flash sale
+# can't sell more than it has. Each product is decremented with one
+# conditional UPDATE (stock >= quantity), which is atomic on its own: two
+# buyers can't both see the last unit. The transaction holding the row lock
+# commits before the gateway is called, so a hot product's row is locked for
+# one statement and commit per buyer, not for a Razorpay round trip.
+#
+# What was taken is recorded as a hold (stock_reservations rows) that is
+# tied to the Razorpay order in the pending-order ledger. Payment deletes
+# the hold and keeps the stock sold. The sweeper returns the stock of holds
+# that expire unpaid, and a failed gateway call returns it at once.
+#
+# Products with stock NULL aren't tracked and are never held.
+#
+# ``session`` defaults to db.session; the async checkout app passes the sync
+# session of its AsyncSession (see api/async_checkout.py).
+
+Hold = namedtuple('Hold', 'id expires_at')
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, requested, available):
+        super().__init__(f"Only {available} of product {product_id} left, {requested} requested")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+def _demand(lines):
+    demand = Counter()
+    for line in lines:
+        demand[line['product_id']] += line['quantity']
+    # a fixed order, so two checkouts never wait on each other's rows
+    return sorted(demand.items())
+
+
+def _take(session, product_id, quantity):
+    """Conditional decrement; the remaining stock, or None if short or untracked."""
+    return session.execute(
+        db.update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .returning(Product.stock)
+    ).scalar()
+
+
+def _put_back(session, claimed):
+    """Return (product_id, quantity) pairs to stock; returns units returned."""
+    returned = Counter()
+    for product_id, quantity in claimed:
+        returned[product_id] += quantity
+    for product_id, quantity in sorted(returned.items()):
+        session.execute(
+            db.update(Product)
+            .where(Product.id == product_id, Product.stock.isnot(None))
+            .values(stock=Product.stock + quantity)
+        )
+    return sum(returned.values())
+
+
+def reserve(quote, ttl, session=None):
+    """Take the stock for a pricing quote and hold it for ``ttl`` seconds.
+
+    Commits and returns a Hold, or None (without a query) if no line is for
+    a tracked product. Raises OutOfStock, with nothing taken, if any
+    product is short.
+    """
+    lines = [line for line in quote['lines'] if line['product_id'] in quote['stocked']]
+    if not lines:
+        return None
+    session = session or db.session
+    hold = Hold(uuid.uuid4().hex, datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl))
+    rows = []
+    for product_id, quantity in _demand(lines):
+        if _take(session, product_id, quantity) is not None:
+            rows.append({'hold_id': hold.id, 'product_id': product_id, 'quantity': quantity,
+                         'expires_at': hold.expires_at})
+            continue
+        available = session.execute(
+            db.select(Product.stock).where(Product.id == product_id)
+        ).scalar()
+        if available is not None:
+            session.rollback()
+            raise OutOfStock(product_id, quantity, available)
+        # no longer tracked (or deleted) since pricing: nothing to hold
+
+    if rows:
+        session.execute(db.insert(StockReservation), rows)
+    session.commit()
+    return hold if rows else None
+
+
+def attach(hold, razorpay_order_id, session):
+    """Tie a hold to its Razorpay order, in the caller's transaction."""
+    session.execute(
+        db.update(StockReservation)
+        .where(StockReservation.hold_id == hold.id)
+        .values(razorpay_order_id=razorpay_order_id)
+    )
+
+
+def release(hold, session=None):
+    """Return a hold's stock now (its checkout failed) and commit."""
+    if hold is None:
+        return 0
+    session = session or db.session
+    session.rollback()
+    claimed = session.execute(
+        db.delete(StockReservation)
+        .where(StockReservation.hold_id == hold.id)
+        .returning(StockReservation.product_id, StockReservation.quantity)
+    ).all()
+    released = _put_back(session, claimed)
+    session.commit()
+    return released
+
+
+def settle(razorpay_order_ids, session):
+    """Drop the holds of paid orders, in the caller's transaction; their
+    stock stays sold. Returns the order ids that still had a hold."""
+    return set(session.execute(
+        db.delete(StockReservation)
+        .where(StockReservation.razorpay_order_id.in_(list(razorpay_order_ids)))
+        .returning(StockReservation.razorpay_order_id)
+    ).scalars())
+
+
+def take_late(razorpay_order_id, lines, session):
+    """Stock for an order paid after its hold expired and was returned.
+
+    The customer has paid, so the stock is taken even if that leaves it
+    below zero; an oversold product is logged.
+    """
+    for product_id, quantity in _demand(lines):
+        left = session.execute(
+            db.update(Product)
+            .where(Product.id == product_id, Product.stock.isnot(None))
+            .values(stock=Product.stock - quantity)
+            .returning(Product.stock)
+        ).scalar()
+        if left is not None and left < 0:
+            logger.warning("Product %s oversold by %s: order %s was paid after its hold expired",
+                           product_id, -left, razorpay_order_id)
+
+
+def release_expired(batch_size=500):
+    """Return the stock of expired holds in batches; returns units returned.
+
+    On Postgres, SKIP LOCKED lets several workers sweep at once, and a hold
+    being settled by a payment at the same moment is skipped.
+    """
+    released = 0
+    while True:
+        ids = db.session.execute(
+            db.select(StockReservation.id)
+            .where(StockReservation.expires_at < datetime.datetime.utcnow())
+            .order_by(StockReservation.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            break
+        claimed = db.session.execute(
+            db.delete(StockReservation)
+            .where(StockReservation.id.in_(ids))
+            .returning(StockReservation.product_id, StockReservation.quantity)
+        ).all()
+        released += _put_back(db.session, claimed)
+        db.session.commit()
+        if len(ids) < batch_size:
+            break
+    return released
+
+
+def adjust(product_id, delta):
+    """Restock (or write off, if negative) without overwriting concurrent
+    holds. Commits; returns the new stock, or None if the product isn't
+    tracked or would go below zero."""
+    left = db.session.execute(
+        db.update(Product)
+        .where(Product.id == product_id, Product.stock + delta >= 0)
+        .values(stock=Product.stock + delta)
+        .returning(Product.stock)
+    ).scalar()
+    db.session.commit()
+    return left
+
+
+def stock_level(product_id):
+    """{'stock', 'reserved'} for a product, or None if it doesn't exist."""
+    stock = db.session.execute(
+        db.select(Product.id, Product.stock).where(Product.id == product_id)
+    ).first()
+    if stock is None:
+        return None
+    reserved = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(StockReservation.quantity), 0))
+        .where(StockReservation.product_id == product_id)
+    ).scalar()
+    return {'product_id': product_id, 'stock': stock.stock, 'reserved': reserved}
+
+
+def init_app(app):
+    sweeper = PeriodicTask('stock-sweeper', app.config['STOCK_SWEEP_INTERVAL'], release_expired)
+    app.extensions['stock_sweeper'] = sweeper
+    app.before_request(lambda: sweeper.start(app))
@@ -0,0 +1,268 @@
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_logger = logging.getLogger('vishga.slow_query')
+
+# Request, SQL and gateway instrumentation, exposed in the Prometheus text
+# format by GET /metrics (api/metrics.py). Metrics are kept per worker
+# process; Prometheus scrapes each worker or sums them.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for values, counts in sorted(series.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels(self.labels, values, [("le", bound)])} {count}')
+            lines.append(f'{self.name}_bucket{_labels(self.labels, values, [("le", "+Inf")])} {counts[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, values)} {counts[-2]}')
+            lines.append(f'{self.name}_count{_labels(self.labels, values)} {counts[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+def _gauges(name, help, values):
+    """Render a dict of numeric stats as one gauge family labelled by stat."""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} gauge']
+    for stat, value in sorted(values.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'{name}{_labels(["stat"], [stat])} {value}')
+    return lines
+
+
+class Metrics:
+    def __init__(self, slow_query_threshold):
+        self.slow_query_threshold = slow_query_threshold
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Request latency by route.',
+            ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Response body size by route (streamed bodies excluded).',
+            ('endpoint', 'method'), SIZE_BUCKETS)
+        self.request_statements = Histogram(
+            'db_statements_per_request', 'SQL statements executed per request.',
+            ('endpoint', 'method'), STATEMENT_BUCKETS)
+        self.request_sql_time = Histogram(
+            'db_time_per_request_seconds', 'Time spent in SQL per request.',
+            ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.slow_queries = Counter(
+            'db_slow_queries_total', 'Statements slower than SLOW_QUERY_THRESHOLD_MS.', ('endpoint',))
+        self.gateway_duration = Histogram(
+            'razorpay_call_duration_seconds', 'Razorpay API call latency.',
+            ('operation', 'outcome'), LATENCY_BUCKETS)
+        self.gateway_response_size = Histogram(
+            'razorpay_response_bytes', 'Razorpay response body size (successful calls).',
+            ('operation',), SIZE_BUCKETS)
+
+    # ---- Requests ----
+
+    def start_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_statements = 0
+        g._metrics_sql_time = 0.0
+
+    def finish_request(self, status, size):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return  # already recorded
+        endpoint = _endpoint()
+        method = request.method
+        self.observe_request(endpoint, method, status, time.perf_counter() - start, size)
+        self.request_statements.observe(g.get('_metrics_statements', 0), endpoint, method)
+        self.request_sql_time.observe(g.get('_metrics_sql_time', 0.0), endpoint, method)
+
+    def observe_request(self, endpoint, method, status, elapsed, size=None):
+        # also called directly by the async checkout app, which has no Flask request
+        self.request_duration.observe(elapsed, endpoint, method, str(status))
+        if size is not None:
+            self.response_size.observe(size, endpoint, method)
+
+    # ---- SQL ----
+
+    def statement_finished(self, statement, elapsed):
+        endpoint = None
+        if has_request_context() and '_metrics_start' in g:
+            g._metrics_statements += 1
+            g._metrics_sql_time += elapsed
+            endpoint = _endpoint()
+        if elapsed * 1000 >= self.slow_query_threshold:
+            self.slow_queries.inc(endpoint or 'background')
+            slow_query_logger.warning(
+                "Slow query (%.1f ms) on %s: %s", elapsed * 1000, endpoint or 'background',
+                ' '.join(statement.split())[:1000],
+            )
+
+    # ---- Gateway ----
+
+    def observe_gateway(self, operation, elapsed, outcome, size=None):
+        self.gateway_duration.observe(elapsed, operation, outcome)
+        if size is not None:
+            self.gateway_response_size.observe(size, operation)
+
+    def render(self, extra=()):
+        lines = []
+        for metric in (self.request_duration, self.response_size, self.request_statements,
+                       self.request_sql_time, self.slow_queries, self.gateway_duration,
+                       self.gateway_response_size):
+            lines.extend(metric.render())
+        for family in extra:
+            lines.extend(family)
+        return '\n'.join(lines) + '\n'
+
+
+def _endpoint():
+    # the route pattern, not the URL, so ids don't explode the label space
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+# ---- SQLAlchemy engine events (every engine, registered once) ----
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_app_context():
+        metrics = current_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.statement_finished(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    # failed statements never reach after_cursor_execute
+    started = exception_context.connection.info.get('_metrics_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+_listening = False
+_listen_lock = threading.Lock()
+
+
+def _listen():
+    global _listening
+    with _listen_lock:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+
+def init_app(app):
+    metrics = Metrics(app.config['SLOW_QUERY_THRESHOLD_MS'])
+    app.extensions['metrics'] = metrics
+    _listen()
+
+    gateway = app.extensions.get('payment_gateway')
+    if gateway is not None:
+        gateway.observer = metrics.observe_gateway
+
+    @app.before_request
+    def start_request():
+        metrics.start_request()
+
+    @app.after_request
+    def finish_request(response):
+        size = None if response.is_streamed else response.calculate_content_length()
+        metrics.finish_request(response.status_code, size)
+        return response
+
+    @app.teardown_request
+    def finish_failed_request(exc):
+        # unhandled exceptions skip after_request
+        if exc is not None:
+            metrics.finish_request(500, None)
+
+
+def get_metrics():
+    return current_app.extensions['metrics']
+
+
+def render():
+    """The /metrics body, including the cache, hashing and gateway snapshots."""
+    extensions = current_app.extensions
+    extra = [
+        _gauges('catalog_cache', 'Catalog response cache counters and size.', extensions['catalog_cache'].snapshot()),
+        _gauges('password_hashing', 'Password hashing pool counters.', extensions['password_hashing'].snapshot()),
+        _gauges('rate_limit', 'Requests limited (429) and shed (503), and requests in flight.',
+                extensions['rate_limit'].snapshot()),
+    ]
+    gateway = extensions['payment_gateway'].snapshot()
+    extra.append([
+        '# HELP razorpay_circuit_state Current circuit breaker state (1 for the active state).',
+        '# TYPE razorpay_circuit_state gauge',
+        *(f'razorpay_circuit_state{_labels(["state"], [state])} {int(gateway["state"] == state)}'
+          for state in ('closed', 'open', 'half_open')),
+        '# HELP razorpay_consecutive_failures Consecutive failed gateway calls.',
+        '# TYPE razorpay_consecutive_failures gauge',
+        f'razorpay_consecutive_failures {gateway["consecutive_failures"]}',
+    ])
+    return get_metrics().render(extra)
@@ -0,0 +1,281 @@
+import datetime
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.cart import Cart, OrdersHistory, PaymentEvent, PendingOrder
+from services import analytics, inventory, pricing
+from services.background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Checkout writes the priced lines of each Razorpay order to pending_orders.
+# Payment confirmation turns them into OrdersHistory rows in one local
+# transaction, without asking the gateway what was ordered. Both the
+# browser's /cart/verify_payment and the Razorpay webhook end up in
+# finalize_orders(); claiming a ledger row deletes it, so whichever path gets
+# there first writes the order and the other is a no-op. Stock held for the
+# order at checkout (services/inventory.py) is settled in the same
+# transaction.
+#
+# ``session`` defaults to db.session; the async checkout app passes the sync
+# session of its AsyncSession (see api/async_checkout.py).
+
+# webhook events that mean an order has been paid
+PAID_EVENTS = ('payment.captured', 'order.paid')
+
+
+def record_pending(razorpay_order_id, quote, source, user_id=None, phone_number=None, address=None,
+                   hold=None, session=None):
+    session = session or db.session
+    if hold is not None:
+        inventory.attach(hold, razorpay_order_id, session)
+    session.add(PendingOrder(
+        razorpay_order_id=razorpay_order_id,
+        user_id=user_id,
+        source=source,
+        lines=quote['lines'],
+        amount_paise=quote['total_paise'],
+        phone_number=phone_number,
+        address=address,
+        reserved_until=hold.expires_at if hold is not None else None,
+    ))
+    session.commit()
+
+
+def is_finalized(razorpay_order_id, session=None):
+    session = session or db.session
+    return session.execute(
+        db.select(OrdersHistory.id).where(OrdersHistory.razorpay_order_id == razorpay_order_id).limit(1)
+    ).first() is not None
+
+
+def finalize_orders(payments, require_user=False, session=None):
+    """Write OrdersHistory rows for paid orders still in the ledger.
+
+    ``payments`` maps razorpay_order_id -> dict with razorpay_payment_id and
+    optionally user_id, phone_number, address (overriding the ledger).
+    Claims all ledger rows with one DELETE ... RETURNING, settles their
+    stock holds, inserts every order line with one executemany, updates the
+    sales rollups and clears purchased cart lines, in the caller's transaction. Returns {razorpay_order_id: rows written}.
+
+    With ``require_user`` ledger rows that have no user_id are left alone:
+    only the browser's verify call knows who bought them.
+    """
+    if not payments:
+        return {}
+    session = session or db.session
+    claim = db.delete(PendingOrder).where(PendingOrder.razorpay_order_id.in_(list(payments)))
+    if require_user:
+        claim = claim.where(PendingOrder.user_id.isnot(None))
+    claimed = session.execute(claim.returning(
+        PendingOrder.razorpay_order_id, PendingOrder.user_id, PendingOrder.lines,
+        PendingOrder.phone_number, PendingOrder.address, PendingOrder.reserved_until,
+    )).all()
+
+    held = {order_id for order_id, *_, reserved_until in claimed if reserved_until is not None}
+    if held:
+        settled = inventory.settle(held, session)
+        for order_id, _, lines, *_ in claimed:
+            if order_id in held and order_id not in settled:
+                inventory.take_late(order_id, lines, session)
+
+    purchase_date = datetime.datetime.utcnow()
+    rows = []
+    cart_lines = []
+    written = {}
+    for order_id, ledger_user_id, lines, ledger_phone, ledger_address, _ in claimed:
+        payment = payments[order_id]
+        buyer_id = ledger_user_id or payment.get('user_id')
+        for line in lines:
+            rows.append({
+                'user_id': buyer_id,
+                'product_id': line['product_id'],
+                'product_name': line['product_name'],
+                'quantity': line['quantity'],
+                'price_at_purchase': line['unit_price_paise'] / 100,
+                'purchase_date': purchase_date,
+                'phone_number': payment.get('phone_number') or ledger_phone,
+                'address': payment.get('address') or ledger_address,
+                'razorpay_order_id': order_id,
+                'razorpay_payment_id': payment.get('razorpay_payment_id'),
+            })
+            if 'cart_item_id' in line:
+                cart_lines.append((buyer_id, line['cart_item_id']))
+        written[order_id] = len(lines)
+
+    if rows:
+        session.execute(db.insert(OrdersHistory), rows)
+        analytics.record_sales(rows, session)
+    if cart_lines:
+        session.execute(
+            db.delete(Cart).where(db.tuple_(Cart.user_id, Cart.id).in_(cart_lines))
+        )
+    if written:
+        # webhook events that arrived before the buyer was known are settled now
+        session.execute(
+            db.update(PaymentEvent)
+            .where(PaymentEvent.status == 'unmatched', PaymentEvent.razorpay_order_id.in_(list(written)))
+            .values(status='done')
+        )
+    return written
+
+
+def finalize_order(razorpay_order_id, razorpay_payment_id=None, user_id=None, phone_number=None, address=None,
+                   session=None):
+    """Finalize one order and commit.
+
+    Returns the number of OrdersHistory rows written, or None when there is
+    no pending order (unknown id, or already finalized by another caller).
+    """
+    session = session or db.session
+    written = finalize_orders({razorpay_order_id: {
+        'razorpay_payment_id': razorpay_payment_id,
+        'user_id': user_id,
+        'phone_number': phone_number,
+        'address': address,
+    }}, session=session)
+    session.commit()
+    return written.get(razorpay_order_id)
+
+
+# ---- Orders from before the ledger ----
+#
+# Razorpay orders created before pending_orders existed have no ledger row,
+# so /cart/verify_payment rebuilds one from the gateway's copy of the order
+# (adopt_legacy_order) and then finalizes it as usual. A single-item order
+# names its product in the receipt (order_rcptid_<product_id>_<ts>) and its
+# quantity in the notes, and is priced as checkout used to price it: at the
+# product's current price. A cart order is priced from the buyer's cart and
+# adopted only if that still adds up to what was charged. No stock was held
+# for these orders, so none is settled. The webhook can't adopt them (it
+# doesn't know the buyer); once every order created before the ledger has
+# been paid or has expired, this fallback can be removed.
+
+def _legacy_quote(razorpay_order, user_id, session):
+    """(source, quote) for a pre-ledger order, or None if it can't be priced."""
+    quantity = (razorpay_order.get('notes') or {}).get('quantity')
+    if quantity is None:
+        quote = pricing.price_cart(user_id, session)
+        if quote['lines'] and quote['total_paise'] == razorpay_order['amount']:
+            return 'cart', quote
+        return None
+    try:
+        product_id = int(razorpay_order['receipt'].split('_')[2])
+        quantity = int(quantity)
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return None
+    quote = pricing.price_item(product_id, quantity, user_id, session)
+    return ('item', quote) if quote is not None else None
+
+
+def adopt_legacy_order(razorpay_order, user_id, phone_number=None, address=None, session=None):
+    """Write the ledger row of a Razorpay order created before the ledger,
+    from the gateway's copy of it. Commits; returns False if its lines can't
+    be rebuilt."""
+    session = session or db.session
+    priced = _legacy_quote(razorpay_order, user_id, session)
+    if priced is None:
+        logger.warning("Can't rebuild the lines of Razorpay order %s (receipt %r, amount %s)",
+                       razorpay_order['id'], razorpay_order.get('receipt'), razorpay_order.get('amount'))
+        return False
+    source, quote = priced
+    try:
+        record_pending(razorpay_order['id'], quote, source, user_id=user_id, phone_number=phone_number,
+                       address=address, session=session)
+    except IntegrityError:
+        session.rollback()  # another verify call adopted it first
+    return True
+
+
+# ---- Webhook queue ----
+
+def enqueue_event(event_id, body):
+    """Persist a verified webhook delivery. Returns False for a redelivery."""
+    entity = body.get('payload', {}).get('payment', {}).get('entity', {})
+    db.session.add(PaymentEvent(
+        event_id=event_id,
+        event=body.get('event'),
+        razorpay_order_id=entity.get('order_id'),
+        razorpay_payment_id=entity.get('id'),
+        payload=body,
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def drain_events(batch_size=100):
+    """Finalize queued webhook events in batches; returns events processed.
+
+    Events are deduplicated by payment id within a batch, and finalization
+    is idempotent across batches. On Postgres, SKIP LOCKED lets several
+    workers drain at once without picking the same events.
+    """
+    processed = 0
+    while True:
+        events = db.session.execute(
+            db.select(PaymentEvent)
+            .where(PaymentEvent.status == 'pending')
+            .order_by(PaymentEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not events:
+            break
+
+        payments = {}
+        seen_payments = set()
+        for event in events:
+            if event.event not in PAID_EVENTS or not event.razorpay_order_id:
+                event.status = 'ignored'
+            elif event.razorpay_payment_id in seen_payments:
+                # e.g. payment.captured and order.paid for the same payment
+                event.status = 'duplicate'
+            else:
+                seen_payments.add(event.razorpay_payment_id)
+                payments.setdefault(event.razorpay_order_id, {'razorpay_payment_id': event.razorpay_payment_id})
+                event.status = 'done'
+
+        written = finalize_orders(payments, require_user=True)
+        # Paid, but neither written now nor already in orders_history: an
+        # item order checked out without a user_id, or one created before the
+        # ledger. Its events are left 'unmatched' until verify_payment
+        # finalizes the order (see `flask payments unmatched`).
+        waiting = set(payments) - set(written)
+        if waiting:
+            waiting -= set(db.session.execute(
+                db.select(OrdersHistory.razorpay_order_id).where(OrdersHistory.razorpay_order_id.in_(waiting))
+            ).scalars())
+        now = datetime.datetime.utcnow()
+        for event in events:
+            if event.status == 'done' and event.razorpay_order_id in waiting:
+                event.status = 'unmatched'
+            event.processed_at = now
+        db.session.commit()
+
+        processed += len(events)
+        if len(events) < batch_size:
+            break
+    return processed
+
+
+def unmatched_events():
+    """Paid orders the webhook couldn't finalize, oldest first: (event, ledger
+    row or None) pairs. Events are settled when the order is finalized."""
+    return db.session.execute(
+        db.select(PaymentEvent, PendingOrder)
+        .outerjoin(PendingOrder, PendingOrder.razorpay_order_id == PaymentEvent.razorpay_order_id)
+        .where(PaymentEvent.status == 'unmatched')
+        .order_by(PaymentEvent.id)
+    ).all()
+
+
+def init_app(app):
+    drainer = PeriodicTask('payment-events', app.config['PAYMENT_EVENTS_DRAIN_INTERVAL'], drain_events)
+    app.extensions['payment_events_drainer'] = drainer
+    app.before_request(lambda: drainer.start(app))
@@ -0,0 +1,380 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+import httpx
+import orjson
+import razorpay
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Everything that talks to Razorpay goes through PaymentGateway: one pooled
+# HTTP session per process, strict timeouts, and a circuit breaker that fails
+# fast while the gateway is unhealthy instead of tying up request workers.
+
+
+class GatewayUnavailable(Exception):
+    pass
+
+
+# network trouble, timeouts, 5xx and non-JSON error pages
+GATEWAY_FAILURES = (
+    requests.RequestException,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+)
+ASYNC_GATEWAY_FAILURES = GATEWAY_FAILURES + (httpx.TransportError,)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; after ``reset_timeout``
+    seconds a single trial call is let through (half-open)."""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class PaymentGateway:
+    def __init__(self, client_factory, breaker, timeout):
+        self._client_factory = client_factory
+        self.breaker = breaker
+        self.timeout = timeout
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.observer = None  # called as observer(operation, seconds, outcome, response_bytes)
+
+    @property
+    def client(self):
+        # built lazily, and again after fork, so workers never share sockets
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self._client_factory()
+                self._pid = os.getpid()
+            return self._client
+
+    def _call(self, operation, fn, *args):
+        if not self.breaker.allow():
+            self._observe(operation, 0.0, 'rejected')
+            raise GatewayUnavailable('Payment gateway circuit is open')
+        start = time.perf_counter()
+        try:
+            result = fn(*args, timeout=self.timeout)
+        except GATEWAY_FAILURES as e:
+            self.breaker.record_failure()
+            self._observe(operation, time.perf_counter() - start, 'failure')
+            logger.warning("Razorpay call failed: %r", e)
+            raise GatewayUnavailable(str(e)) from e
+        except Exception:
+            # a 4xx answer still means the gateway is up
+            self.breaker.record_success()
+            self._observe(operation, time.perf_counter() - start, 'client_error')
+            raise
+        self.breaker.record_success()
+        self._observe(operation, time.perf_counter() - start, 'success', result)
+        return result
+
+    def _observe(self, operation, elapsed, outcome, result=None):
+        if self.observer is not None:
+            # the SDK hands back parsed JSON; its re-encoded length stands in
+            # for the body size, the same for both gateways
+            size = len(orjson.dumps(result)) if result is not None else None
+            self.observer(operation, elapsed, outcome, size)
+
+    def create_order(self, data):
+        return self._call('order.create', self.client.order.create, data)
+
+    def fetch_order(self, order_id):
+        return self._call('order.fetch', self.client.order.fetch, order_id)
+
+    def verify_payment_signature(self, params):
+        # local HMAC check, no network call
+        return self.client.utility.verify_payment_signature(params)
+
+    def verify_webhook_signature(self, body, signature, secret):
+        """Check X-Razorpay-Signature against the raw request body (bytes)."""
+        if not secret or not signature:
+            return False
+        expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def snapshot(self):
+        return {'state': self.breaker.state, 'consecutive_failures': self.breaker.failures}
+
+
+def make_session(pool_size, retries, backoff):
+    session = requests.Session()
+    # connect errors are retried for every method (nothing was sent yet);
+    # reads and 5xx only for GET, so order creation is never duplicated
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# ---- Emulator ----
+
+class _EmulatorOrders:
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    def create(self, data=None, **kwargs):
+        return self._emulator.create_order(data or {})
+
+    def fetch(self, order_id, data=None, **kwargs):
+        return self._emulator.fetch_order(order_id)
+
+
+class _AsyncEmulatorClient:
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    async def create_order(self, data):
+        await asyncio.sleep(self._emulator.delay())
+        return self._emulator.create_order(data, wait=False)
+
+    async def aclose(self):
+        pass
+
+
+class RazorpayEmulator:
+    """In-process stand-in for razorpay.Client, for offline and load testing.
+
+    Supports order.create/order.fetch and signature checks with injected
+    latency (seconds, uniformly jittered +-50%) and a random error rate.
+    """
+
+    def __init__(self, key_id, key_secret, latency=0.0, error_rate=0.0, seed=None):
+        self.auth = (key_id, key_secret or 'emulator_secret')
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._orders = {}
+        self._lock = threading.Lock()
+        self.order = _EmulatorOrders(self)
+        self.utility = razorpay.Utility(self)
+
+    def delay(self):
+        """Latency (seconds) to inject into the next call."""
+        return self.latency * self._random.uniform(0.5, 1.5) if self.latency else 0.0
+
+    def _simulate(self, wait=True):
+        if wait and self.latency:
+            time.sleep(self.delay())
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise razorpay.errors.ServerError('Emulated gateway failure')
+
+    def create_order(self, data, wait=True):
+        self._simulate(wait)
+        if not isinstance(data.get('amount'), int) or data['amount'] < 100:
+            raise razorpay.errors.BadRequestError('Order amount less than minimum amount allowed')
+        order = {
+            'id': f"order_{uuid.uuid4().hex[:14]}",
+            'entity': 'order',
+            'amount': data['amount'],
+            'amount_paid': 0,
+            'amount_due': data['amount'],
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'notes': data.get('notes', {}),
+            'status': 'created',
+            'attempts': 0,
+            'created_at': int(time.time()),
+        }
+        with self._lock:
+            self._orders[order['id']] = order
+        return dict(order)
+
+    def fetch_order(self, order_id):
+        self._simulate()
+        with self._lock:
+            order = self._orders.get(order_id)
+        if order is None:
+            raise razorpay.errors.BadRequestError('The id provided does not exist')
+        return dict(order)
+
+    def sign_payment(self, order_id, payment_id):
+        """Signature Razorpay Checkout would hand the browser for this payment."""
+        message = f"{order_id}|{payment_id}".encode()
+        return hmac.new(self.auth[1].encode(), message, hashlib.sha256).hexdigest()
+
+
+# ---- Async gateway (asgi.py) ----
+
+RAZORPAY_API = 'https://api.razorpay.com/v1/'
+
+
+class AsyncRazorpayClient:
+    """order.create over a pooled httpx.AsyncClient.
+
+    Error responses raise the razorpay SDK's exceptions so both gateways
+    classify them alike. Only connection failures are retried: nothing was
+    sent yet, and order creation is not idempotent.
+    """
+
+    def __init__(self, auth, timeout, pool_size, retries, base_url=RAZORPAY_API):
+        connect_timeout, read_timeout = timeout
+        transport = httpx.AsyncHTTPTransport(
+            retries=retries,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self._http = httpx.AsyncClient(
+            base_url=base_url, auth=auth, transport=transport,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def create_order(self, data):
+        response = await self._http.post('orders', json=data)
+        try:
+            body = response.json()
+        except ValueError:
+            raise razorpay.errors.GatewayError(f'Razorpay answered {response.status_code} without JSON')
+        if response.status_code >= 500:
+            raise razorpay.errors.ServerError(body.get('error', {}).get('description', response.reason_phrase))
+        if response.status_code >= 400:
+            raise razorpay.errors.BadRequestError(body.get('error', {}).get('description', response.reason_phrase))
+        return body
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class AsyncPaymentGateway:
+    """Non-blocking counterpart of PaymentGateway for the async checkout app.
+
+    Shares the sync gateway's circuit breaker and observer, so both paths see
+    one gateway state per process. The client is built on first use, inside
+    the running event loop, and closed with aclose() at shutdown.
+    """
+
+    def __init__(self, gateway, client_factory):
+        self.gateway = gateway
+        self._client_factory = client_factory
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    async def _call(self, operation, fn, *args):
+        breaker = self.gateway.breaker
+        if not breaker.allow():
+            self.gateway._observe(operation, 0.0, 'rejected')
+            raise GatewayUnavailable('Payment gateway circuit is open')
+        start = time.perf_counter()
+        try:
+            result = await fn(*args)
+        except ASYNC_GATEWAY_FAILURES as e:
+            breaker.record_failure()
+            self.gateway._observe(operation, time.perf_counter() - start, 'failure')
+            logger.warning("Razorpay call failed: %r", e)
+            raise GatewayUnavailable(str(e)) from e
+        except Exception:
+            breaker.record_success()
+            self.gateway._observe(operation, time.perf_counter() - start, 'client_error')
+            raise
+        breaker.record_success()
+        self.gateway._observe(operation, time.perf_counter() - start, 'success', result)
+        return result
+
+    async def create_order(self, data):
+        return await self._call('order.create', self.client.create_order, data)
+
+    def verify_payment_signature(self, params):
+        return self.gateway.verify_payment_signature(params)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def init_app(app):
+    config = app.config
+    timeout = (config['RAZORPAY_CONNECT_TIMEOUT'], config['RAZORPAY_READ_TIMEOUT'])
+    auth = (config['RAZORPAY_KEY_ID'], config['RAZORPAY_KEY_SECRET'])
+
+    if config['RAZORPAY_EMULATOR']:
+        emulator = RazorpayEmulator(
+            *auth,
+            latency=config['RAZORPAY_EMULATOR_LATENCY'],
+            error_rate=config['RAZORPAY_EMULATOR_ERROR_RATE'],
+        )
+        client_factory = lambda: emulator
+        async_client_factory = lambda: _AsyncEmulatorClient(emulator)
+    else:
+        def client_factory():
+            session = make_session(
+                config['RAZORPAY_POOL_SIZE'], config['RAZORPAY_RETRIES'], config['RAZORPAY_RETRY_BACKOFF']
+            )
+            return razorpay.Client(session=session, auth=auth)
+
+        def async_client_factory():
+            return AsyncRazorpayClient(auth, timeout, config['RAZORPAY_ASYNC_POOL_SIZE'], config['RAZORPAY_RETRIES'])
+
+    breaker = CircuitBreaker(config['RAZORPAY_BREAKER_THRESHOLD'], config['RAZORPAY_BREAKER_RESET'])
+    gateway = PaymentGateway(client_factory, breaker, timeout)
+    app.extensions['payment_gateway'] = gateway
+    app.extensions['payment_gateway_async'] = AsyncPaymentGateway(gateway, async_client_factory)
+
+
+def get_gateway():
+    return current_app.extensions['payment_gateway']
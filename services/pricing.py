@@ -0,0 +1,125 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from extensions import db
+from models.cart import Cart
+from models.product import Product, ProductImage
+from services.catalog import image_url
+
+# Prices are stored as rupee floats (Product.prize). Everything here works in
+# integer paise, the unit Razorpay expects, so totals never pick up float
+# rounding error.
+#
+# ``session`` defaults to db.session; the async checkout app passes the sync
+# session of its AsyncSession (see api/async_checkout.py).
+
+
+def to_paise(rupees):
+    return int((Decimal(str(rupees)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def _line(product_id, product_name, quantity, prize, cart_item_id=None):
+    unit_price_paise = to_paise(prize)
+    line = {
+        'product_id': product_id,
+        'product_name': product_name,
+        'quantity': quantity,
+        'unit_price_paise': unit_price_paise,
+        'line_total_paise': unit_price_paise * quantity,
+    }
+    if cart_item_id is not None:
+        line['cart_item_id'] = cart_item_id
+    return line
+
+
+def _quote(user_id, lines, stocked=()):
+    return {
+        'user_id': user_id,
+        'lines': lines,
+        'total_paise': sum(line['line_total_paise'] for line in lines),
+        # products whose stock is tracked, for inventory.reserve()
+        'stocked': set(stocked),
+    }
+
+
+def price_carts(user_ids, session=None):
+    """Price many carts with a single joined query.
+
+    Returns {user_id: quote}. Lines whose product no longer exists are left
+    out, as checkout always did.
+    """
+    session = session or db.session
+    user_ids = list(user_ids)
+    lines = {user_id: [] for user_id in user_ids}
+    stocked = {user_id: [] for user_id in user_ids}
+    if user_ids:
+        rows = session.execute(
+            db.select(Cart.user_id, Cart.id, Cart.product_id, Cart.quantity, Product.name, Product.prize,
+                      Product.stock)
+            .join(Product, Product.id == Cart.product_id)
+            .where(Cart.user_id.in_(user_ids))
+            .order_by(Cart.user_id, Cart.id)
+        )
+        for user_id, cart_item_id, product_id, quantity, name, prize, stock in rows:
+            lines[user_id].append(_line(product_id, name, quantity, prize, cart_item_id))
+            if stock is not None:
+                stocked[user_id].append(product_id)
+    return {user_id: _quote(user_id, user_lines, stocked[user_id]) for user_id, user_lines in lines.items()}
+
+
+def price_cart(user_id, session=None):
+    return price_carts([user_id], session)[user_id]
+
+
+def price_item(product_id, quantity, user_id=None, session=None):
+    """Quote a single-product purchase, or None if the product doesn't exist."""
+    session = session or db.session
+    row = session.execute(
+        db.select(Product.name, Product.prize, Product.stock).where(Product.id == product_id)
+    ).first()
+    if row is None:
+        return None
+    stocked = [product_id] if row.stock is not None else []
+    return _quote(user_id, [_line(product_id, row.name, quantity, row.prize)], stocked)
+
+
+def cart_summary(user_id, session=None):
+    """The cart page in one query: every line with the product's current
+    name, price and first image, flags for renamed and deleted products,
+    and the total of what can still be bought (in paise).
+    """
+    session = session or db.session
+    # correlated MIN(id) per product, answered from ix_product_images_product_id;
+    # image rows (and their blobs) are never read
+    first_image = (
+        db.select(db.func.min(ProductImage.id))
+        .where(ProductImage.product_id == Product.id)
+        .scalar_subquery()
+    )
+    rows = session.execute(
+        db.select(Cart.id, Cart.product_id, Cart.product_name, Cart.quantity,
+                  Product.name, Product.prize, first_image.label('image_id'))
+        .outerjoin(Product, Product.id == Cart.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.id)
+    )
+    lines = []
+    total_paise = 0
+    for cart_item_id, product_id, cart_name, quantity, name, prize, image_id in rows:
+        deleted = prize is None
+        line = {
+            'id': cart_item_id,
+            'product_id': product_id,
+            'product_name': cart_name if deleted else name,
+            'quantity': quantity,
+            'prize': prize,
+            'unit_price_paise': None if deleted else to_paise(prize),
+            'line_total_paise': None if deleted else to_paise(prize) * quantity,
+            'image': image_url(image_id) if image_id is not None else None,
+            'name_changed': not deleted and cart_name != name,
+            'product_deleted': deleted,
+        }
+        if not deleted:
+            total_paise += line['line_total_paise']
+        lines.append(line)
+    return {'user_id': user_id, 'lines': lines, 'total_paise': total_paise}
+
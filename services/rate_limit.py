@@ -0,0 +1,275 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+
+from services import tokens
+
+logger = logging.getLogger(__name__)
+
+# Admission control for the hot endpoints, checked before any database,
+# hashing or gateway work:
+#
+# * @limit(ip='10/minute', user='5/minute') on a route gives each client IP
+#   and each user a token bucket that refills at that rate and holds up to
+#   one period's worth. An empty bucket answers 429 with Retry-After. The
+#   user is the one a valid Bearer token was issued to, never a field of the
+#   request body, which a client could vary or set to someone else's id;
+#   without a token the user rule applies to the client IP.
+# * MAX_CONCURRENT_REQUESTS caps the requests a process has in flight; past
+#   it a request is shed with 503 before its first before_request hook.
+#
+# Buckets live in process memory (bounded, idle ones expire), so the limits
+# are per worker. Set RATE_LIMIT_REDIS_URL (needs the redis package) to share
+# them across workers; if Redis is unreachable requests are let through.
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Rule:
+    def __init__(self, by, spec):
+        count, _, period = spec.partition('/')
+        if period not in PERIODS or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Rate must look like '10/minute', got {spec!r}")
+        self.by = by
+        self.spec = spec
+        self.capacity = int(count)
+        self.rate = int(count) / PERIODS[period]  # tokens per second
+
+
+# ---- Buckets ----
+
+class MemoryBuckets:
+    """Token buckets as (tokens, updated, full_at) tuples in an LRU dict.
+
+    A bucket that has refilled completely is the same as no bucket, so
+    entries past full_at are dropped from the cold end as they are reached,
+    and the dict never holds more than ``max_keys`` entries.
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Take one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._expire(now)
+        return retry_after
+
+    def _expire(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if bucket[2] > now and len(buckets) <= self.max_keys:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# one round trip, atomic across workers; the clock is the server's
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + math.max(0, now - tonumber(bucket[2])) * rate)
+end
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+
+class RedisBuckets:
+    """The same buckets in Redis, shared by every worker."""
+
+    def __init__(self, url, prefix='ratelimit:', timeout=0.05):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_REDIS_URL is set but the redis package is not installed')
+        self._errors = (redis.RedisError,)
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.prefix = prefix
+        self._warned_at = 0
+
+    def take(self, key, rate, capacity):
+        try:
+            return float(self._script(keys=[self.prefix + key], args=[rate, capacity]))
+        except self._errors as e:
+            # fail open: losing rate limiting beats losing the site
+            now = time.monotonic()
+            if now - self._warned_at > 60:
+                self._warned_at = now
+                logger.warning("Rate limit backend unavailable, not limiting: %r", e)
+            return 0
+
+    def __len__(self):
+        return 0  # not tracked locally
+
+
+# ---- Limiter ----
+
+class RateLimiter:
+    def __init__(self, buckets, enabled=True, max_concurrent=0, proxy_count=0):
+        self.buckets = buckets
+        self.enabled = enabled
+        self.max_concurrent = max_concurrent
+        self.proxy_count = proxy_count
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+        self._stats_lock = threading.Lock()
+        self.stats = {'limited': 0, 'shed': 0, 'in_flight': 0}
+
+    def _count(self, stat, delta=1):
+        with self._stats_lock:
+            self.stats[stat] += delta
+
+    def client_ip(self, remote_addr, access_route):
+        # behind N trusted proxies the client is the Nth address from the right
+        if self.proxy_count and len(access_route) >= self.proxy_count:
+            return access_route[-self.proxy_count]
+        return remote_addr or 'unknown'
+
+    def check(self, endpoint, rules, ip, user_id=None):
+        """Take a token from each of the rules' buckets; returns None if the
+        request is allowed, else the seconds the client should wait.
+
+        ``user_id`` comes from a verified auth token (see token_user); without
+        one, user rules are keyed by ``ip``.
+        """
+        if not self.enabled:
+            return None
+        user = f'uid:{user_id}' if user_id is not None else f'ip:{ip}'
+        wait = 0
+        for rule in rules:
+            value = ip if rule.by == 'ip' else user
+            wait = max(wait, self.buckets.take(f'{endpoint}|{rule.by}|{value}', rule.rate, rule.capacity))
+        if wait:
+            self._count('limited')
+            return wait
+        return None
+
+    def enter(self):
+        """Claim an in-flight slot; False means shed the request."""
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            self._count('shed')
+            return False
+        self._count('in_flight')
+        return True
+
+    def leave(self):
+        self._count('in_flight', -1)
+        if self._slots is not None:
+            self._slots.release()
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, max_concurrent=self.max_concurrent, buckets=len(self.buckets))
+
+
+def token_user(authorization):
+    """The user id of a valid Bearer token in an Authorization header value,
+    else None. Needs an app context."""
+    if not authorization:
+        return None
+    return tokens.verify(authorization.replace('Bearer ', ''))
+
+
+def too_many_requests(retry_after):
+    return jsonify({'error': 'Too many requests, please retry later'}), 429, {
+        'Retry-After': str(max(1, math.ceil(retry_after))),
+    }
+
+
+def limit(ip=None, user=None):
+    """Per-route token buckets, e.g. @limit(ip='10/minute', user='5/minute')."""
+    rules = [Rule(by, spec) for by, spec in (('ip', ip), ('user', user)) if spec]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = get_limiter()
+            user_id = None
+            if limiter.enabled and any(r.by == 'user' for r in rules):
+                user_id = token_user(request.headers.get('Authorization'))
+            ip_address = limiter.client_ip(request.remote_addr, request.access_route)
+            retry_after = limiter.check(request.endpoint, rules, ip_address, user_id)
+            if retry_after is not None:
+                return too_many_requests(retry_after)
+            return view(*args, **kwargs)
+
+        wrapper.rate_limits = rules
+        return wrapper
+
+    return decorator
+
+
+def exempt(view):
+    """Never shed this view (e.g. /metrics, which matters most under load)."""
+    view.rate_limit_exempt = True
+    return view
+
+
+def init_app(app):
+    config = app.config
+    if config['RATE_LIMIT_REDIS_URL']:
+        buckets = RedisBuckets(config['RATE_LIMIT_REDIS_URL'])
+    else:
+        buckets = MemoryBuckets(config['RATE_LIMIT_MAX_KEYS'])
+    limiter = RateLimiter(
+        buckets,
+        enabled=config['RATE_LIMIT_ENABLED'],
+        max_concurrent=config['MAX_CONCURRENT_REQUESTS'],
+        proxy_count=config['RATE_LIMIT_PROXY_COUNT'],
+    )
+    app.extensions['rate_limit'] = limiter
+
+    # registered before every other hook, so a shed request does no work
+    @app.before_request
+    def admit():
+        view = app.view_functions.get(request.endpoint)
+        if getattr(view, 'rate_limit_exempt', False):
+            return None
+        if not limiter.enter():
+            return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+        g._rate_limit_slot = True
+        return None
+
+    @app.teardown_request
+    def release(exc):
+        if g.pop('_rate_limit_slot', False):
+            limiter.leave()
+
+
+def get_limiter():
+    return current_app.extensions['rate_limit']
@@ -0,0 +1,229 @@
+import re
+
+from extensions import db
+from models.product import Product
+
+# Product search over name, line_description, benefit and details.
+#
+# Postgres: products.search_vector is a generated tsvector column (weighted
+# name > line_description > benefit/details) with a GIN index, so the
+# database keeps it in sync on every write. Autocomplete uses a second GIN
+# index on to_tsvector('simple', name) with prefix queries.
+#
+# SQLite (local development): an FTS5 table, product_search, keyed by
+# product id. The write handlers in api/products.py call index_product()
+# and remove_product() in the same transaction as the product change.
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_OFFSET = 1000
+AUTOCOMPLETE_LIMIT = 8
+
+PG_SCHEMA = [
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(line_description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(benefit, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(details, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_prefix ON products USING GIN (to_tsvector('simple', name))",
+]
+
+# prefix='2 3' keeps extra index entries for short prefixes, so
+# autocomplete doesn't scan every term of the name column
+SQLITE_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        name, line_description, benefit, details, prefix='2 3'
+    )
+"""
+
+# bm25 column weights, same order as the FTS5 columns
+SQLITE_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+_fts = db.table('product_search', db.column('rowid'))
+_fts_match = db.literal_column('product_search').op('MATCH')
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def parse_page(offset, limit):
+    try:
+        offset = int(offset) if offset is not None else 0
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise SearchQueryError('offset and limit must be integers')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise SearchQueryError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    if not 0 <= offset <= MAX_OFFSET:
+        raise SearchQueryError(f'offset must be between 0 and {MAX_OFFSET}')
+    return offset, limit
+
+
+def terms(text):
+    """Lowercased words of a user query; punctuation and operators dropped."""
+    return _WORD.findall((text or '').lower())
+
+
+def _dialect():
+    return db.session.get_bind(mapper=Product.__mapper__).dialect.name
+
+
+# ---- Index maintenance ----
+
+_sqlite_ready = set()
+
+
+def _ensure_sqlite():
+    # dev databases come from create_all(); build the FTS table on first use
+    bind = db.session.get_bind(mapper=Product.__mapper__)
+    if bind.url in _sqlite_ready:
+        return
+    exists = db.session.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE name = 'product_search'")
+    ).first()
+    if not exists:
+        db.session.execute(db.text(SQLITE_SCHEMA))
+        _fill_sqlite()
+    _sqlite_ready.add(bind.url)
+
+
+def _fill_sqlite():
+    db.session.execute(db.text(
+        "INSERT INTO product_search (rowid, name, line_description, benefit, details) "
+        "SELECT id, name, line_description, benefit, details FROM products"
+    ))
+
+
+def _prepare_request():
+    # before the request touches the session, so the DDL commits on its own
+    if _dialect() == 'sqlite' and db.session.get_bind(mapper=Product.__mapper__).url not in _sqlite_ready:
+        _ensure_sqlite()
+        db.session.commit()
+
+
+def init_app(app):
+    app.before_request(_prepare_request)
+
+
+def install():
+    """Create the search column/indexes (Postgres) or FTS table (SQLite) if missing."""
+    if _dialect() == 'postgresql':
+        for statement in PG_SCHEMA:
+            db.session.execute(db.text(statement))
+    else:
+        _ensure_sqlite()
+    db.session.commit()
+
+
+def reindex():
+    """Rebuild the SQLite FTS table from products. Postgres needs no reindex."""
+    if _dialect() == 'postgresql':
+        install()
+        return
+    _ensure_sqlite()
+    db.session.execute(db.text("DELETE FROM product_search"))
+    _fill_sqlite()
+    db.session.commit()
+
+
+def index_product(product):
+    """Sync one product into the index; call before committing its change."""
+    index_products([product])
+
+
+def index_products(products):
+    if not products or _dialect() == 'postgresql':
+        return  # generated column
+    _ensure_sqlite()
+    db.session.flush()
+    ids = [{'id': p.id} for p in products]
+    db.session.execute(db.text("DELETE FROM product_search WHERE rowid = :id"), ids)
+    db.session.execute(
+        db.text(
+            "INSERT INTO product_search (rowid, name, line_description, benefit, details) "
+            "VALUES (:id, :name, :line_description, :benefit, :details)"
+        ),
+        [
+            {
+                'id': p.id,
+                'name': p.name,
+                'line_description': p.line_description,
+                'benefit': p.benefit,
+                'details': p.details,
+            }
+            for p in products
+        ],
+    )
+
+
+def remove_product(product_id):
+    if _dialect() == 'postgresql':
+        return
+    _ensure_sqlite()
+    db.session.execute(db.text("DELETE FROM product_search WHERE rowid = :id"), {'id': product_id})
+
+
+# ---- Queries ----
+
+def search(q, offset=0, limit=DEFAULT_PAGE_SIZE):
+    """Return (product ids by relevance, next_offset). next_offset is None on the last page."""
+    words = terms(q)
+    if not words:
+        return [], None
+
+    if _dialect() == 'postgresql':
+        query = db.func.websearch_to_tsquery('english', q)
+        vector = db.literal_column('products.search_vector')
+        stmt = (
+            db.select(Product.id)
+            .where(vector.op('@@')(query))
+            .order_by(db.func.ts_rank_cd(vector, query).desc(), Product.id)
+        )
+    else:
+        _ensure_sqlite()
+        # every word must match; quoting makes each one a literal token
+        stmt = (
+            db.select(_fts.c.rowid)
+            .where(_fts_match(' '.join(f'"{w}"' for w in words)))
+            .order_by(db.func.bm25(db.literal_column('product_search'), *SQLITE_WEIGHTS), _fts.c.rowid)
+        )
+
+    ids = db.session.execute(stmt.offset(offset).limit(limit + 1)).scalars().all()
+    next_offset = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_offset = offset + limit
+    return ids, next_offset
+
+
+def autocomplete(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Products whose name has words starting with every word of ``prefix``."""
+    words = terms(prefix)
+    if not words:
+        return []
+
+    if _dialect() == 'postgresql':
+        query = db.func.to_tsquery('simple', ' & '.join(f'{w}:*' for w in words))
+        stmt = db.select(Product.id, Product.name).where(
+            db.func.to_tsvector('simple', Product.name).op('@@')(query)
+        )
+    else:
+        _ensure_sqlite()
+        match = ' AND '.join(f'name : "{w}"*' for w in words)
+        stmt = (
+            db.select(Product.id, Product.name)
+            .join(_fts, _fts.c.rowid == Product.id)
+            .where(_fts_match(match))
+        )
+
+    # names that start with the typed text first, then shorter names
+    starts = db.case((db.func.lower(Product.name).startswith(' '.join(words)), 0), else_=1)
+    stmt = stmt.order_by(starts, db.func.length(Product.name), Product.name).limit(limit)
+    return [{'id': pid, 'name': name} for pid, name in db.session.execute(stmt)]
@@ -0,0 +1,102 @@
+import decimal
+import operator
+from functools import lru_cache
+
+import orjson
+from flask.json.provider import JSONProvider
+
+from extensions import db
+from models.auth import User
+from models.cart import Cart, OrdersHistory
+from models.product import Product, ProductImage
+
+# Response schemas. A Schema names the fields of one model once and compiles
+# an attrgetter for them, so ORM objects and db.select() rows serialize the
+# same way; list endpoints select schema.columns and never hydrate objects.
+# Encoding is orjson's (OrjsonProvider is the app's JSON provider), which
+# also writes datetimes as ISO 8601 without a Python call per value.
+
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+class Schema:
+    def __init__(self, model, *fields):
+        self.model = model
+        self.fields = fields
+        self.columns = tuple(getattr(model, f) for f in fields)
+        getter = operator.attrgetter(*fields)
+        self._values = getter if len(fields) > 1 else lambda row: (getter(row),)
+
+    @lru_cache(maxsize=None)
+    def only(self, *fields):
+        """The same schema restricted to ``fields`` (cached, so cheap per request)."""
+        return Schema(self.model, *fields)
+
+    def select(self):
+        return db.select(*self.columns)
+
+    def dump(self, row):
+        """One row as a dict; a plain tuple is read positionally, in field order."""
+        return dict(zip(self.fields, row if type(row) is tuple else self._values(row)))
+
+    def dump_many(self, rows):
+        fields = self.fields
+        values = self._values
+        return [dict(zip(fields, row if type(row) is tuple else values(row))) for row in rows]
+
+    def dumps(self, rows):
+        """A JSON array of ``rows``, as bytes."""
+        return orjson.dumps(self.dump_many(rows), option=DUMPS_OPTIONS)
+
+    def dumps_lines(self, rows):
+        """``rows`` as newline-delimited JSON, as bytes."""
+        return b''.join(orjson.dumps(item, option=DUMPS_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+                        for item in self.dump_many(rows))
+
+
+PRODUCT = Schema(Product, 'id', 'name', 'prize', 'details', 'benefit', 'line_description')
+PRODUCT_IMAGE = Schema(ProductImage, 'id', 'product_id', 'mimetype')
+CART = Schema(Cart, 'id', 'user_id', 'product_id', 'product_name', 'quantity')
+ORDERS_HISTORY = Schema(
+    OrdersHistory, 'id', 'user_id', 'product_id', 'product_name', 'quantity', 'price_at_purchase',
+    'purchase_date', 'phone_number', 'address',
+)
+# what a user sees of their own orders
+USER_ORDERS_HISTORY = ORDERS_HISTORY.only(
+    'id', 'user_id', 'product_id', 'product_name', 'quantity', 'price_at_purchase', 'purchase_date',
+)
+USER = Schema(User, 'id', 'username', 'email', 'phone_number', 'address')
+USER_SUMMARY = USER.only('id', 'username', 'email')
+
+
+# ---- Flask JSON provider ----
+
+def _default(value):
+    # what orjson doesn't know natively, encoded as Flask's default provider does
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class OrjsonProvider(JSONProvider):
+    """jsonify() and request.get_json() through orjson. Keys keep their
+    insertion (schema) order; dates and datetimes are ISO 8601."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=DUMPS_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=DUMPS_OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = OrjsonProvider(app)
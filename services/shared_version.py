@@ -0,0 +1,51 @@
+import fcntl
+import os
+
+
+class SharedVersion:
+    """Monotonic counter in a small file, visible to every worker process on the host.
+
+    Reads are a stat() plus, only when the file changed, a read. Bumps are
+    serialized with flock and published with an atomic rename.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._stat_key = None
+        self._value = 0
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def get(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat_key != self._stat_key:
+            self._value = self._read()
+            self._stat_key = stat_key
+        return self._value
+
+    def changed_at(self):
+        """Wall-clock time of the last bump (0 if never bumped)."""
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def bump(self):
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = self._read() + 1
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(str(value))
+            os.replace(tmp_path, self.path)
+        return value
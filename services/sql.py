@@ -0,0 +1,36 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+
+# INSERT ... ON CONFLICT is dialect-specific in SQLAlchemy; Postgres in
+# production, SQLite locally.
+_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def upsert_insert(model, session=None):
+    """An insert() for ``model`` that supports on_conflict_do_update/nothing."""
+    session = session or db.session
+    dialect = session.get_bind(mapper=model.__mapper__).dialect.name
+    try:
+        return _INSERTS[dialect](model)
+    except KeyError:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+
+def greatest(*values, session=None):
+    """GREATEST(...) on Postgres; SQLite's max() with several arguments."""
+    return _pick('greatest', 'max', values, session)
+
+
+def least(*values, session=None):
+    """LEAST(...) on Postgres; SQLite's min() with several arguments."""
+    return _pick('least', 'min', values, session)
+
+
+def _pick(postgres, other, values, session):
+    session = session or db.session
+    name = postgres if session.get_bind().dialect.name == 'postgresql' else other
+    return getattr(db.func, name)(*values)
@@ -0,0 +1,38 @@
+import logging
+import time
+
+from extensions import db
+from services import hashing, payments
+
+logger = logging.getLogger(__name__)
+
+# Worker lifecycle for preforking servers (see gunicorn.conf.py). The app is
+# imported once in the master; each forked worker drops the connection pools
+# it inherited and, with WARMUP on, primes itself before it accepts requests.
+# Razorpay clients and the hashing pool are already per process (built on
+# first use after fork), so only the database needs explicit handling.
+
+
+def after_fork(app):
+    """Forget pooled connections inherited from the parent, leaving its sockets open."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def warm_up(app):
+    """Connect to every bind, build the gateway client, start the hashing pool
+    and request WARMUP_PATHS to fill the catalog cache. Returns seconds taken."""
+    start = time.perf_counter()
+    with app.app_context():
+        for engine in db.engines.values():
+            with engine.connect() as conn:
+                conn.exec_driver_sql('SELECT 1')
+        payments.get_gateway().client
+        hashing.get_executor().warm()
+    client = app.test_client()
+    for path in app.config['WARMUP_PATHS']:
+        response = client.get(path)
+        if response.status_code != 200:
+            logger.warning("Warmup request %s returned %s", path, response.status_code)
+    return time.perf_counter() - start
@@ -0,0 +1,135 @@
+import datetime
+import os
+import threading
+import uuid
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from extensions import db
+from models.auth import RevokedToken, Token
+from services.background import PeriodicTask
+from services.shared_version import SharedVersion
+
+# Auth tokens are signed with the app secret and carry their own expiry, so
+# token_required checks them in memory. The only shared state is the set of
+# tokens revoked by /logout: it lives in revoked_tokens and each worker
+# reloads its copy when the shared revocation version changes.
+
+SALT = 'auth-token'
+
+
+class RevocationSet:
+    def __init__(self, version):
+        self.version = version
+        self._seen = None
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        current = self.version.get()
+        if current == self._seen:
+            return
+        with self._lock:
+            if current == self._seen:
+                return
+            now = datetime.datetime.utcnow()
+            rows = db.session.execute(
+                db.select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+            )
+            self._revoked = {jti: expires_at for jti, expires_at in rows}
+            self._seen = current
+
+    def __contains__(self, jti):
+        self._refresh()
+        return jti in self._revoked
+
+    def add(self, jti, expires_at):
+        db.session.merge(RevokedToken(jti=jti, expires_at=expires_at))
+        db.session.commit()
+        self.version.bump()
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+def init_app(app):
+    os.makedirs(app.instance_path, exist_ok=True)
+    version_path = app.config.get('TOKEN_REVOCATION_VERSION_PATH') or os.path.join(app.instance_path, 'revocations.version')
+    app.extensions['token_revocations'] = RevocationSet(SharedVersion(version_path))
+
+    sweeper = PeriodicTask('token-sweeper', app.config['TOKEN_SWEEP_INTERVAL'], sweep_expired)
+    app.extensions['token_sweeper'] = sweeper
+    app.before_request(lambda: sweeper.start(app))
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt=SALT)
+
+
+def _revocations():
+    return current_app.extensions['token_revocations']
+
+
+def issue(user_id):
+    return _serializer().dumps({'uid': user_id, 'jti': uuid.uuid4().hex})
+
+
+def _load(token_str):
+    """Return (payload, issued_at) for a valid signed token, else None."""
+    try:
+        return _serializer().loads(
+            token_str, max_age=current_app.config['TOKEN_TTL'], return_timestamp=True
+        )
+    except (SignatureExpired, BadSignature):
+        return None
+
+
+def _is_legacy(token_str):
+    return '.' not in token_str
+
+
+def verify(token_str):
+    """Return the user id for a valid, unrevoked token, else None."""
+    if _is_legacy(token_str):
+        token = Token.query.filter(Token.token == token_str, Token.expires_at > datetime.datetime.now()).first()
+        return token.user_id if token else None
+
+    loaded = _load(token_str)
+    if loaded is None:
+        return None
+    payload, _ = loaded
+    if payload.get('jti') in _revocations():
+        return None
+    return payload.get('uid')
+
+
+def revoke(token_str):
+    if _is_legacy(token_str):
+        Token.query.filter_by(token=token_str).delete()
+        db.session.commit()
+        return
+
+    loaded = _load(token_str)
+    if loaded is None:
+        return  # already expired or not ours
+    payload, issued_at = loaded
+    expires_at = issued_at.replace(tzinfo=None) + datetime.timedelta(seconds=current_app.config['TOKEN_TTL'])
+    _revocations().add(payload['jti'], expires_at)
+
+
+def sweep_expired(batch_size=1000):
+    """Delete expired tokens/revocations in batches; returns rows deleted."""
+    deleted = 0
+    for model, now in ((Token, datetime.datetime.now()), (RevokedToken, datetime.datetime.utcnow())):
+        key = model.__mapper__.primary_key[0]
+        while True:
+            keys = db.session.execute(
+                db.select(key).where(model.expires_at <= now).limit(batch_size)
+            ).scalars().all()
+            if not keys:
+                break
+            db.session.execute(db.delete(model).where(key.in_(keys)))
+            db.session.commit()
+            deleted += len(keys)
+    return deleted
@@ -0,0 +1,17 @@
+import tempfile
+
+from flask import Request, current_app
+
+# Multipart uploads are parsed into SpooledTemporaryFiles: small files stay
+# in memory, anything past UPLOAD_SPOOL_BYTES goes to disk while it is still
+# being received. Werkzeug rejects bodies over MAX_CONTENT_LENGTH (413)
+# before reading them, and image_store.copy_image() caps each image.
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_BYTES'])
+
+
+def init_app(app):
+    app.request_class = UploadRequest
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# app.py and extensions.py read the environment at import time. Everything is
+# overridden, not defaulted, so a DATABASE_URL in the developer's shell or
+# .env never points the tests at a real database.
+WORKDIR = tempfile.mkdtemp(prefix='vishga-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(WORKDIR, 'test.db')}",
+    'SECRET_KEY': 'test-secret',
+    'RAZORPAY_EMULATOR': '1',
+    'RAZORPAY_KEY_ID': 'rzp_test_key',
+    'RAZORPAY_KEY_SECRET': 'rzp_test_secret',
+    'RAZORPAY_EMULATOR_LATENCY': '0',
+    'RAZORPAY_EMULATOR_ERROR_RATE': '0',
+    'TOKEN_SWEEP_INTERVAL': '0',
+    'PAYMENT_EVENTS_DRAIN_INTERVAL': '0',
+    'STOCK_SWEEP_INTERVAL': '0',
+    'RATE_LIMIT_ENABLED': '0',
+    'IMAGE_STORE_PATH': os.path.join(WORKDIR, 'objects'),
+    'CATALOG_VERSION_PATH': os.path.join(WORKDIR, 'catalog.version'),
+    'TOKEN_REVOCATION_VERSION_PATH': os.path.join(WORKDIR, 'revocations.version'),
+})
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db(app):
+    """A fresh schema per test, inside an app context."""
+    from extensions import db
+    from services import catalog_cache
+
+    with app.app_context():
+        db.create_all()
+        catalog_cache.invalidate()  # responses cached from the last test's catalog
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
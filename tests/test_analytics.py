@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+
+from models.analytics import SalesDailyRollup, UserSalesRollup
+from models.cart import OrdersHistory
+from models.product import Product
+from services import analytics, orders, pricing
+
+
+@pytest.fixture
+def products(db):
+    tea = Product(name='Tea', prize=250.0, details='500g')
+    honey = Product(name='Honey', prize=99.99, details='250g')
+    db.session.add_all([tea, honey])
+    db.session.commit()
+    return tea.id, honey.id
+
+
+def _buy(order_id, user_id, *lines):
+    quote = pricing.price_item(*lines[0])
+    for product_id, quantity in lines[1:]:
+        quote['lines'] += pricing.price_item(product_id, quantity)['lines']
+    quote['total_paise'] = sum(line['line_total_paise'] for line in quote['lines'])
+    orders.record_pending(order_id, quote, 'cart', user_id=user_id)
+    orders.finalize_order(order_id, razorpay_payment_id=f'pay_{order_id}')
+
+
+def _rollups(db):
+    db.session.expire_all()
+    daily = db.session.execute(
+        db.select(SalesDailyRollup.product_id, SalesDailyRollup.day, SalesDailyRollup.units,
+                  SalesDailyRollup.revenue_paise).order_by(SalesDailyRollup.product_id, SalesDailyRollup.day)
+    ).all()
+    users = db.session.execute(
+        db.select(UserSalesRollup.user_id, UserSalesRollup.orders, UserSalesRollup.units,
+                  UserSalesRollup.revenue_paise, UserSalesRollup.first_purchase_at,
+                  UserSalesRollup.last_purchase_at).order_by(UserSalesRollup.user_id)
+    ).all()
+    return daily, users
+
+
+def test_incremental_rollups_match_rebuild(db, products):
+    tea, honey = products
+    _buy('order_1', 1, (tea, 2), (honey, 3))
+    _buy('order_2', 1, (honey, 1))
+    _buy('order_3', 2, (tea, 1))
+
+    incremental = _rollups(db)
+    assert analytics.rebuild() == (2, 2)
+    assert _rollups(db) == incremental
+
+    daily, users = incremental
+    assert [(units, revenue) for _, _, units, revenue in daily] == [(3, 75000), (4, 39996)]
+    assert [(user_id, n, units, revenue) for user_id, n, units, revenue, *_ in users] == [
+        (1, 2, 6, 89996), (2, 1, 1, 25000)]
+
+
+def test_out_of_order_finalizes_keep_purchase_bounds(db, products):
+    tea, _ = products
+    day = datetime.datetime(2026, 3, 10, 9, 30)
+    rows = [{'user_id': 1, 'product_id': tea, 'product_name': 'Tea', 'quantity': 1, 'price_at_purchase': 250.0,
+             'purchase_date': day + datetime.timedelta(days=offset), 'razorpay_order_id': f'order_{offset}'}
+            for offset in (1, 2, 0)]  # the oldest order is finalized last
+    for row in rows:
+        db.session.execute(db.insert(OrdersHistory), [row])
+        analytics.record_sales([row])
+    db.session.commit()
+
+    incremental = _rollups(db)
+    analytics.rebuild()
+    assert _rollups(db) == incremental
+
+    [(_, orders_count, _, _, first, last)] = incremental[1]
+    assert (orders_count, first, last) == (3, day, day + datetime.timedelta(days=2))
+
+
+def test_reports_read_the_rollups(client, products):
+    tea, honey = products
+    _buy('order_1', 1, (tea, 1))
+    _buy('order_2', 2, (honey, 5))
+    today = datetime.datetime.utcnow().date().isoformat()
+
+    top = client.get('/admin/analytics/top_products?by=units').get_json()
+    assert [(row['product_name'], row['units']) for row in top] == [('Honey', 5), ('Tea', 1)]
+    revenue = client.get(f'/admin/analytics/revenue?since={today}&until={today}&product_id={tea}').get_json()
+    assert revenue == [{'day': today, 'units': 1, 'revenue_paise': 25000}]
+    assert client.get('/admin/analytics/lifetime_value/2').get_json()['revenue_paise'] == 49995
+    assert [row['user_id'] for row in client.get('/admin/analytics/lifetime_value').get_json()] == [2, 1]
+    assert client.get('/admin/analytics/lifetime_value/3').status_code == 404
+
+
+@pytest.mark.parametrize('query', ['since=2026-02-01&until=2026-01-01', 'since=last-week', 'limit=0', 'by=price'])
+def test_bad_report_queries_are_rejected(client, query):
+    assert client.get(f'/admin/analytics/top_products?{query}').status_code == 400
@@ -0,0 +1,4 @@
+def test_app_serves_metrics(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'http_request_duration_seconds' in response.data
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from api.async_checkout import AsyncCheckoutApp
+from models.product import Product
+from services import db_routing, inventory, orders, tokens
+from services.rate_limit import MemoryBuckets
+
+ORIGIN = 'https://shop.example.com'
+
+
+@pytest.fixture
+def replicated(db, monkeypatch):
+    """An app whose reads may go to a replica (the same file), so writes pin."""
+    from app import create_app
+
+    monkeypatch.setenv('DATABASE_REPLICA_URL', os.environ['DATABASE_URL'])
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    # init_app registered the bind on the shared db; the session app has no engine for it
+    db.metadatas.pop(db_routing.REPLICA, None)
+
+
+@pytest.fixture
+def product(db):
+    product = Product(name='Tea', prize=250.0, details='500g', stock=10)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def _post(app, requests, request_headers=()):
+    """Run (path, body) requests through the ASGI app; (status, headers, body) each."""
+    asgi = AsyncCheckoutApp(app, fallback=None)
+
+    async def post(path, body):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': json.dumps(body).encode()}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': path, 'client': ('127.0.0.1', 0),
+                 'headers': [(b'origin', ORIGIN.encode()), (b'content-type', b'application/json'),
+                             *((name.lower().encode(), value.encode()) for name, value in request_headers)]}
+        await asgi(scope, receive, send)
+        headers = {}
+        for name, value in messages[0]['headers']:
+            headers.setdefault(name.decode(), []).append(value.decode())
+        return messages[0]['status'], headers, json.loads(messages[1]['body'])
+
+    async def run():
+        try:
+            return [await post(path, body) for path, body in requests]
+        finally:
+            await app.extensions['payment_gateway_async'].aclose()
+            await app.extensions['async_db'].dispose()
+
+    return asyncio.run(run())
+
+
+def test_async_and_flask_responses_carry_the_same_headers(replicated, product):
+    body = {'product_id': product, 'quantity': 1, 'user_id': 1}
+    flask_response = replicated.test_client().post('/cart/buy_item', json=body, headers={'Origin': ORIGIN})
+    [(status, headers, _)] = _post(replicated, [('/cart/buy_item', body)])
+
+    assert flask_response.status_code == status == 200
+    for name in ('Access-Control-Allow-Origin', 'Access-Control-Allow-Credentials',
+                 'Access-Control-Expose-Headers', 'Content-Type'):
+        assert headers[name.lower()] == [flask_response.headers[name]]
+    assert headers['access-control-allow-origin'] == [ORIGIN]
+    assert db_routing.PIN_HEADER in flask_response.headers
+    assert float(headers[db_routing.PIN_HEADER.lower()][0]) > 0
+    assert any(cookie.startswith(db_routing.PIN_COOKIE) for cookie in headers['set-cookie'])
+    assert int(headers['content-length'][0]) > 0
+
+
+def test_failed_async_writes_do_not_pin(replicated):
+    [(status, headers, body)] = _post(replicated, [('/cart/buy_item', {'quantity': 1})])
+
+    assert (status, body) == (400, {'error': 'Product ID is required'})
+    assert headers['access-control-allow-origin'] == [ORIGIN]
+    assert db_routing.PIN_HEADER.lower() not in headers
+    assert 'set-cookie' not in headers
+
+
+def test_async_checkout_and_verify_place_the_order(app, product):
+    [(status, _, checkout)] = _post(app, [('/cart/buy_item', {'product_id': product, 'quantity': 2, 'user_id': 7})])
+    assert status == 200 and checkout['amount'] == 50000
+
+    signature = app.extensions['payment_gateway'].client.sign_payment(checkout['order_id'], 'pay_1')
+    verify = {'razorpay_order_id': checkout['order_id'], 'razorpay_payment_id': 'pay_1',
+              'razorpay_signature': signature, 'user_id': 7}
+    first, second = _post(app, [('/cart/verify_payment', verify), ('/cart/verify_payment', verify)])
+
+    assert first[0] == second[0] == 200
+    assert (first[2], second[2]) == ({'message': 'Payment successful and order placed'},) * 2
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': 8, 'reserved': 0}
+
+
+def test_async_checkout_accepts_numeric_string_user_ids(app, client, product):
+    client.post('/cart', json={'userId': 5, 'productId': product, 'productName': 'Tea', 'quantity': 1})
+
+    (ok, _, checkout), (bad, _, error) = _post(app, [('/cart/checkout', {'user_id': '5'}),
+                                                    ('/cart/checkout', {'user_id': 'abc'})])
+
+    assert (ok, checkout['amount']) == (200, 25000)
+    assert (bad, error) == (400, {'error': 'User ID must be an integer'})
+
+
+def test_async_verify_adopts_an_order_from_before_the_ledger(app, db, product):
+    gateway = app.extensions['payment_gateway']
+    order = gateway.create_order({'amount': 25000, 'currency': 'INR',
+                                  'receipt': f'order_rcptid_{product}_1700000000.0', 'notes': {'quantity': 1}})
+    verify = {'razorpay_order_id': order['id'], 'razorpay_payment_id': 'pay_1',
+              'razorpay_signature': gateway.client.sign_payment(order['id'], 'pay_1'), 'user_id': 2}
+
+    [(status, _, body)] = _post(app, [('/cart/verify_payment', verify)])
+
+    assert (status, body) == (200, {'message': 'Payment successful and order placed'})
+    assert orders.is_finalized(order['id'])
+
+
+def test_async_user_limits_follow_the_auth_token(app, db, monkeypatch):
+    limiter = app.extensions['rate_limit']
+    monkeypatch.setattr(limiter, 'enabled', True)
+    monkeypatch.setattr(limiter, 'buckets', MemoryBuckets(100))
+    token = tokens.issue(6)
+
+    signed_in = _post(app, [('/cart/checkout', {'user_id': 6})] * 11,
+                      request_headers=[('Authorization', f'Bearer {token}')])
+    anonymous = _post(app, [('/cart/checkout', {'user_id': 6})])
+
+    assert [status for status, *_ in signed_in] == [400] * 10 + [429]  # an empty cart, then limited
+    assert signed_in[-1][1]['retry-after'] == ['6']
+    assert anonymous[0][0] == 400  # the IP's own bucket
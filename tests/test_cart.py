@@ -0,0 +1,42 @@
+import pytest
+
+from models.product import Product
+
+
+@pytest.fixture
+def product(db):
+    product = Product(name='Tea', prize=250.0, details='500g')
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def _add_to_cart(client, user_id, product_id, quantity=2):
+    response = client.post('/cart', json={'userId': user_id, 'productId': product_id,
+                                          'productName': 'Tea', 'quantity': quantity})
+    assert response.status_code in (200, 201)
+
+
+@pytest.mark.parametrize('user_id', [5, '5'])
+def test_checkout_accepts_numeric_string_user_ids(client, product, user_id):
+    _add_to_cart(client, 5, product)
+
+    response = client.post('/cart/checkout', json={'user_id': user_id})
+
+    assert response.status_code == 200
+    assert response.get_json()['amount'] == 50000
+
+
+@pytest.mark.parametrize('user_id', ['abc', '5.0', 5.5, True, ['5']])
+def test_checkout_rejects_non_integer_user_ids(client, user_id):
+    response = client.post('/cart/checkout', json={'user_id': user_id})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'User ID must be an integer'}
+
+
+def test_buy_item_and_verify_reject_non_integer_user_ids(client, product):
+    buy = client.post('/cart/buy_item', json={'product_id': product, 'user_id': 'abc'})
+    verify = client.post('/cart/verify_payment', json={'user_id': 'abc'})
+
+    assert buy.status_code == verify.status_code == 400
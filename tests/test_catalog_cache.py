@@ -0,0 +1,82 @@
+import pytest
+
+from models.product import Product
+from services.catalog_cache import CatalogCache, _Entry
+from services.shared_version import SharedVersion
+
+
+def _worker(tmp_path, max_bytes=1024):
+    return CatalogCache(SharedVersion(str(tmp_path / 'catalog.version')), max_bytes=max_bytes,
+                        ttl=300, stale_ttl=3600)
+
+
+def _render(body, calls):
+    def render(version):
+        calls.append(version)
+        return _Entry(200, body, {}, version)
+    return render
+
+
+def test_bump_in_another_worker_invalidates(tmp_path):
+    worker, other_worker = _worker(tmp_path), _worker(tmp_path)
+    calls = []
+
+    assert worker.get_or_render('/products', _render(b'v1', calls)).body == b'v1'
+    assert worker.get_or_render('/products', _render(b'v1', calls)).body == b'v1'
+    assert calls == [0]
+
+    other_worker.version.bump()
+
+    assert worker.get_or_render('/products', _render(b'v2', calls)).body == b'v2'
+    assert calls == [0, 1]
+    assert (worker.stats['hits'], worker.stats['misses']) == (1, 2)
+
+
+def test_stale_entry_is_served_when_refresh_fails(tmp_path):
+    worker = _worker(tmp_path)
+    worker.get_or_render('/products', _render(b'v1', []))
+    worker.version.bump()
+
+    def failing(version):
+        raise RuntimeError('database unavailable')
+
+    assert worker.get_or_render('/products', failing).body == b'v1'
+    assert worker.stats['stale_errors'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    worker = _worker(tmp_path, max_bytes=10)
+    for key in ('/a', '/b', '/c'):
+        worker.get_or_render(key, _render(b'1234', []))
+
+    assert worker.snapshot()['entries'] == 2
+    assert worker.stats['evictions'] == 1
+    calls = []
+    worker.get_or_render('/a', _render(b'1234', calls))
+    assert calls == [0]  # '/a' was the one evicted
+
+
+def test_catalog_writes_invalidate_cached_responses(client, db):
+    product = Product(name='Tea', prize=250.0, details='500g')
+    db.session.add(product)
+    db.session.commit()
+
+    assert client.get(f'/products/{product.id}').get_json()['name'] == 'Tea'
+    product.name = 'Green tea'
+    db.session.commit()  # not through the API: nothing invalidates
+    assert client.get(f'/products/{product.id}').get_json()['name'] == 'Tea'
+
+    assert client.put(f'/products/{product.id}', data={'name': 'Black tea'}).status_code == 200
+    assert client.get(f'/products/{product.id}').get_json()['name'] == 'Black tea'
+
+
+@pytest.mark.parametrize('path', ['/products?limit=0', '/products/999999'])
+def test_client_errors_are_cached_until_the_catalog_changes(app, client, path):
+    stats = app.extensions['catalog_cache'].stats
+    first = client.get(path)
+    hits = stats['hits']
+    second = client.get(path)
+
+    assert first.status_code == second.status_code and first.status_code in (400, 404)
+    assert first.get_data() == second.get_data()
+    assert stats['hits'] == hits + 1
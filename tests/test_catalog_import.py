@@ -0,0 +1,101 @@
+import io
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from services import catalog_import
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'green').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _import(client, manifest, name, images=None, query=''):
+    data = {'manifest': (io.BytesIO(manifest.encode()), name)}
+    if images is not None:
+        data['images'] = (images, 'images.zip')
+    return client.post(f'/products/import{query}', data=data, content_type='multipart/form-data')
+
+
+def test_csv_import_reports_bad_rows_and_keeps_the_rest(client):
+    manifest = (
+        'name,price,details,lineDescription,images\n'
+        'Green Tea,250,Loose leaf,Fresh,tea.png\n'
+        'Honey,,Raw,,\n'
+        'Ginger Tea,220,Spiced,,missing.png\n'
+        'Greek Yogurt,-1,Plain,,\n'
+        'Jam,99.5,Mixed fruit,,\n'
+    )
+    response = _import(client, manifest, 'catalog.csv', _zip({'tea.png': _png(), 'notes.txt': b'hi'}),
+                       query='?batch_size=1')
+    report = response.get_json()
+
+    assert response.status_code == 201
+    assert (report['rows'], report['created'], report['images'], report['failed']) == (5, 2, 1, 3)
+    assert report['errors'] == [
+        {'row': 3, 'error': 'missing prize'},
+        {'row': 4, 'error': 'image missing.png not found in the archive'},
+        {'row': 5, 'error': 'prize must be between 0 and 10000000'},
+    ]
+    tea = client.get(f"/products/{report['product_ids'][0]}").get_json()
+    assert (tea['name'], tea['prize'], tea['line_description'], len(tea['images'])) == ('Green Tea', 250.0, 'Fresh', 1)
+    assert [p['name'] for p in client.get('/products/search?q=jam&fields=name').get_json()] == ['Jam']
+
+
+def test_jsonl_import_skips_lines_that_are_not_objects(client):
+    lines = [json.dumps({'name': 'Green Tea', 'prize': 250, 'details': 'Loose leaf'}), '', '{not json', '[1, 2]',
+             json.dumps({'name': 'Honey', 'prize': '199', 'details': 'Raw', 'images': ['honey.png']})]
+    response = _import(client, '\n'.join(lines), 'catalog.jsonl', _zip({'honey.png': _png()}))
+    report = response.get_json()
+
+    assert (report['created'], report['images']) == (2, 1)
+    assert [error['row'] for error in report['errors']] == [3, 4]
+
+
+def test_nothing_imported_answers_400(client):
+    response = _import(client, 'name,price,details\nTea,,Leaf\n', 'catalog.csv')
+
+    assert response.status_code == 400
+    assert response.get_json()['created'] == 0
+
+
+@pytest.mark.parametrize('name, images, query', [
+    ('catalog.txt', None, ''),
+    ('catalog.csv', io.BytesIO(b'not a zip'), ''),
+    ('catalog.csv', None, '?batch_size=0'),
+])
+def test_bad_uploads_are_rejected(client, name, images, query):
+    assert _import(client, 'name,price,details\n', name, images, query).status_code == 400
+
+
+def test_validate_row_maps_aliases_and_image_lists():
+    values, images = catalog_import.validate_row(
+        {'name': ' Tea ', 'price': '12.5', 'details': 'Leaf', 'images': 'a.png; b.png;', 'colour': 'green'})
+
+    assert values == {'name': 'Tea', 'prize': 12.5, 'details': 'Leaf'}
+    assert images == ['a.png', 'b.png']
+
+
+@pytest.mark.parametrize('prize, error', [
+    ('nan', 'prize must be a finite number'),
+    ('inf', 'prize must be a finite number'),
+    ('-Infinity', 'prize must be a finite number'),
+    ('1e308', 'prize must be between 0 and 10000000'),
+    ('abc', 'prize must be a number'),
+])
+def test_validate_row_rejects_prices_that_are_not_sane(prize, error):
+    with pytest.raises(catalog_import.RowError, match=error):
+        catalog_import.validate_row({'name': 'Tea', 'prize': prize, 'details': 'Leaf'})
@@ -0,0 +1,25 @@
+import pytest
+
+from app import create_app
+
+
+def test_missing_secret_key_fails_at_startup(monkeypatch):
+    monkeypatch.delenv('SECRET_KEY')
+    monkeypatch.delenv('FLASK_DEBUG', raising=False)
+
+    with pytest.raises(RuntimeError, match='SECRET_KEY'):
+        create_app()
+
+
+def test_debug_without_secret_key_uses_a_random_key(monkeypatch):
+    monkeypatch.delenv('SECRET_KEY')
+    monkeypatch.setenv('FLASK_DEBUG', '1')
+
+    app = create_app()
+
+    assert app.debug
+    assert len(app.secret_key) == 24
+
+
+def test_secret_key_from_environment(app):
+    assert app.secret_key == 'test-secret'
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+from flask import Flask, g, jsonify
+
+from services import db_routing
+
+
+@pytest.fixture
+def routed():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_BINDS'] = {db_routing.REPLICA: 'sqlite://'}
+    app.config['DB_REPLICA_MAX_LAG'] = 5
+    db_routing.init_app(app)
+
+    @app.route('/write', methods=['POST'])
+    def write():
+        return jsonify({})
+
+    @app.route('/read')
+    @db_routing.read_only
+    def read():
+        return jsonify({'replica': g.get('_db_use_replica', False)})
+
+    return app.test_client()
+
+
+def test_reads_go_to_the_replica(routed):
+    assert routed.get('/read').get_json() == {'replica': True}
+
+
+def test_write_pins_reads_through_the_cookie(routed):
+    response = routed.post('/write')
+
+    assert db_routing.PIN_COOKIE in response.headers['Set-Cookie']
+    assert routed.get('/read').get_json() == {'replica': False}
+
+
+def test_write_pins_reads_through_the_header(routed):
+    until = routed.post('/write').headers[db_routing.PIN_HEADER]
+    cross_site = routed.application.test_client()  # the Lax cookie isn't sent
+
+    assert cross_site.get('/read').get_json() == {'replica': True}
+    assert cross_site.get('/read', headers={db_routing.PIN_HEADER: until}).get_json() == {'replica': False}
+
+
+def test_expired_or_garbage_pin_is_ignored(routed):
+    for value in (f'{time.time() - 1:.3f}', 'soon'):
+        assert routed.get('/read', headers={db_routing.PIN_HEADER: value}).get_json() == {'replica': True}
+
+
+def test_pin_header_is_exposed_to_cross_origin_clients(client):
+    response = client.get('/metrics', headers={'Origin': 'https://shop.example.com'})
+
+    assert db_routing.PIN_HEADER in response.headers.get('Access-Control-Expose-Headers', '')
@@ -0,0 +1,75 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+from models.cart import OrdersHistory
+from services import exports
+
+DAY = datetime.datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def history(db):
+    rows = [OrdersHistory(user_id=1 + i % 2, product_id=10 + i, product_name=f'Item {i}', quantity=i + 1,
+                          price_at_purchase=100.0 + i, purchase_date=DAY + datetime.timedelta(days=i))
+            for i in range(5)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_export_streams_every_row_in_id_order(client, history):
+    response = client.get('/orders_history?format=ndjson')
+
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    rows = _ndjson(response)
+    assert [row['id'] for row in rows] == history
+    assert list(rows[0]) == list(exports.EXPORT_COLUMNS)
+
+
+def test_csv_export_has_a_header_and_iso_dates(client, history):
+    response = client.get('/orders_history?format=csv')
+
+    assert response.headers['Content-Disposition'] == 'attachment; filename=orders_history.csv'
+    header, *rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert header == list(exports.EXPORT_COLUMNS)
+    assert len(rows) == 5
+    assert rows[0][header.index('purchase_date')] == DAY.isoformat()
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson'])
+def test_date_and_id_filters(client, history, fmt):
+    def ids(query):
+        response = client.get(f'/orders_history?format={fmt}&{query}')
+        rows = response.get_json() if fmt == 'json' else _ndjson(response)
+        return sorted(row['id'] for row in rows)
+
+    assert ids('since=2026-03-02') == history[1:]  # purchases at noon: the 1st is before
+    assert ids('until=2026-03-03T12:00') == history[:2]  # until is exclusive
+    assert ids('since=2026-03-02&until=2026-03-04') == history[1:3]
+    assert ids(f'since_id={history[2]}') == history[3:]
+
+
+def test_partitions_keep_the_stream_chunked(db, history):
+    chunks = list(exports.stream('ndjson', {}, batch_size=2))
+
+    assert [chunk.count(b'\n') for chunk in chunks] == [2, 2, 1]
+
+
+@pytest.mark.parametrize('query, error', [
+    ('since=yesterday', 'since must be an ISO date or datetime'),
+    ('since_id=x', 'since_id must be an integer'),
+    ('format=xml', 'format must be json, ndjson or csv'),
+])
+def test_bad_queries_are_rejected(client, query, error):
+    response = client.get(f'/orders_history?{query}')
+
+    assert (response.status_code, response.get_json()) == (400, {'error': error})
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from services.hashing import HashingBusy, HashingExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = HashingExecutor('pbkdf2:sha256:1000', max_workers=1, max_queue=1, timeout=0.2)
+    executor.warm()
+    yield executor
+    executor._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_hash_and_check(executor):
+    pwhash = executor.hash('secret')
+
+    assert pwhash.startswith('pbkdf2:sha256:1000$')
+    assert executor.check(pwhash, 'secret')
+    assert not executor.check(pwhash, 'wrong')
+    assert not executor.needs_rehash(pwhash)
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(executor):
+    with pytest.raises(HashingBusy):
+        executor._run(time.sleep, 0.6)  # times out after 0.2s, keeps running
+    with pytest.raises(HashingBusy):
+        executor._run(time.sleep, 0.6)  # queued behind it, times out too
+
+    # both slots are still held by work in the pool: rejected at once
+    started = time.perf_counter()
+    with pytest.raises(HashingBusy):
+        executor._run(int)
+    assert time.perf_counter() - started < 0.1
+    assert executor.snapshot()['rejected'] == 1
+    assert executor.snapshot()['in_flight'] == 2
+
+    _wait_for(lambda: executor.snapshot()['in_flight'] == 0)
+    assert executor._run(int) == 0
+    stats = executor.snapshot()
+    assert stats['timeouts'] == 2
+    assert stats['submitted'] == 3
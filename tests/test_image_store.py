@@ -0,0 +1,53 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from models.product import ProductImage
+from services import image_store
+
+
+def _png(colour):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), colour).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_incomplete_backend_fails_when_built():
+    class UploadOnly(image_store.ImageStore):
+        def attach_stream(self, image, stream):
+            pass
+
+    with pytest.raises(TypeError, match='send'):
+        UploadOnly()
+
+
+def test_filesystem_store_writes_each_image_once(tmp_path):
+    store = image_store.FilesystemImageStore(str(tmp_path))
+    first, second, other = ProductImage(), ProductImage(), ProductImage()
+
+    store.attach(first, _png('green'))
+    store.attach(second, _png('green'))
+    store.attach(other, _png('red'))
+
+    assert first.content_hash == second.content_hash != other.content_hash
+    assert (first.mimetype, first.image_data) == ('image/png', None)
+    objects = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert sorted(objects) == sorted([first.content_hash, other.content_hash])
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda root: image_store.DatabaseImageStore(max_bytes=64),
+    lambda root: image_store.FilesystemImageStore(root, max_bytes=64),
+], ids=['database', 'filesystem'])
+def test_stores_reject_large_or_unknown_files(tmp_path, make_store):
+    store = make_store(str(tmp_path))
+
+    with pytest.raises(image_store.ImageRejected) as too_large:
+        store.attach(ProductImage(), _png('green') + b'\0' * 64)
+    with pytest.raises(image_store.ImageRejected, match='Unsupported image type'):
+        store.attach(ProductImage(), b'%PDF-1.7 not an image')
+
+    assert too_large.value.status == 413
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names]  # no temp files left
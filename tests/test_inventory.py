@@ -0,0 +1,110 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models.cart import StockReservation
+from models.product import Product
+from services import inventory, pricing
+
+
+def _product(db, stock, name='Tea'):
+    product = Product(name=name, prize=250.0, details='500g', stock=stock)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def _expire_holds(db):
+    db.session.execute(
+        db.update(StockReservation)
+        .values(expires_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=1))
+    )
+    db.session.commit()
+
+
+def test_reserve_and_release(db):
+    product = _product(db, 5)
+
+    hold = inventory.reserve(pricing.price_item(product, 2), ttl=600)
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': 3, 'reserved': 2}
+
+    assert inventory.release(hold) == 2
+    assert inventory.release(hold) == 0
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': 5, 'reserved': 0}
+
+
+def test_short_cart_takes_nothing(db):
+    plenty = _product(db, 5, name='Tea')
+    short = _product(db, 1, name='Honey')
+    quote = pricing.price_item(plenty, 2)
+    quote['lines'] += pricing.price_item(short, 2)['lines']
+    quote['stocked'] |= {short}
+
+    with pytest.raises(inventory.OutOfStock) as raised:
+        inventory.reserve(quote, ttl=600)
+
+    assert (raised.value.product_id, raised.value.requested, raised.value.available) == (short, 2, 1)
+    assert inventory.stock_level(plenty) == {'product_id': plenty, 'stock': 5, 'reserved': 0}
+    assert inventory.stock_level(short)['stock'] == 1
+
+
+def test_untracked_products_are_not_held(db):
+    product = _product(db, None)
+    assert inventory.reserve(pricing.price_item(product, 3), ttl=600) is None
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': None, 'reserved': 0}
+
+
+def test_release_expired_returns_only_expired_holds(db):
+    product = _product(db, 10)
+    inventory.reserve(pricing.price_item(product, 2), ttl=600)
+    inventory.reserve(pricing.price_item(product, 3), ttl=600)
+    _expire_holds(db)
+    inventory.reserve(pricing.price_item(product, 1), ttl=600)
+
+    assert inventory.release_expired(batch_size=1) == 5
+    assert inventory.release_expired() == 0
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': 9, 'reserved': 1}
+
+
+def test_concurrent_reservations_never_oversell(app, db):
+    stock, buyers = 20, 60
+    product = _product(db, stock)
+    lowest = []
+    done = threading.Event()
+
+    def buy(_):
+        with app.app_context():
+            try:
+                return inventory.reserve(pricing.price_item(product, 1), ttl=600)
+            except inventory.OutOfStock:
+                return None
+            finally:
+                db.session.remove()
+
+    def watch():
+        with app.app_context():
+            while not done.is_set():
+                lowest.append(db.session.execute(
+                    db.select(Product.stock).where(Product.id == product)).scalar())
+                db.session.rollback()
+            db.session.remove()
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            holds = [hold for hold in pool.map(buy, range(buyers)) if hold is not None]
+    finally:
+        done.set()
+        watcher.join()
+
+    assert len(holds) == stock
+    assert min(lowest) >= 0
+    db.session.rollback()
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': 0, 'reserved': stock}
+
+    _expire_holds(db)
+    assert inventory.release_expired() == stock
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': stock, 'reserved': 0}
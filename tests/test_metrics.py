@@ -0,0 +1,28 @@
+import re
+
+
+def _sample(body, name, **labels):
+    label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf'^{name}\{{{re.escape(label_text)}\}} (\S+)$', body, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_gateway_calls_record_latency_and_response_size(client, app):
+    before = client.get('/metrics').get_data(as_text=True)
+
+    order = app.extensions['payment_gateway'].create_order({'amount': 49900, 'currency': 'INR'})
+    app.extensions['payment_gateway'].fetch_order(order['id'])
+    body = client.get('/metrics').get_data(as_text=True)
+
+    for operation in ('order.create', 'order.fetch'):
+        count = 'razorpay_response_bytes_count'
+        assert _sample(body, count, operation=operation) == _sample(before, count, operation=operation) + 1
+        assert _sample(body, 'razorpay_call_duration_seconds_count', operation=operation, outcome='success') >= 1
+    assert _sample(body, 'razorpay_response_bytes_sum', operation='order.create') > 100
+
+
+def test_request_metrics_are_labelled_by_route(client, db):
+    client.get('/products/12345')
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'endpoint="/products/<int:product_id>"' in body
@@ -0,0 +1,150 @@
+import pytest
+
+from models.cart import Cart, OrdersHistory, PaymentEvent, PendingOrder
+from models.product import Product
+from services import inventory, orders, pricing
+
+
+@pytest.fixture
+def product(db):
+    product = Product(name='Tea', prize=250.0, details='500g', stock=10)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def _checkout(order_id, product_id, quantity=2, user_id=1):
+    quote = pricing.price_item(product_id, quantity, user_id=user_id)
+    hold = inventory.reserve(quote, ttl=600)
+    orders.record_pending(order_id, quote, 'item', user_id=user_id, hold=hold)
+
+
+def _history(db, order_id):
+    return db.session.execute(
+        db.select(OrdersHistory).where(OrdersHistory.razorpay_order_id == order_id)
+    ).scalars().all()
+
+
+def test_finalize_order_writes_once(db, product):
+    _checkout('order_a', product)
+
+    assert orders.finalize_order('order_a', razorpay_payment_id='pay_a') == 1
+    assert orders.finalize_order('order_a', razorpay_payment_id='pay_a') is None
+    assert orders.is_finalized('order_a')
+
+    [row] = _history(db, 'order_a')
+    assert (row.quantity, row.price_at_purchase, row.razorpay_payment_id) == (2, 250.0, 'pay_a')
+    assert db.session.get(PendingOrder, 'order_a') is None
+    assert inventory.stock_level(product) == {'product_id': product, 'stock': 8, 'reserved': 0}
+
+
+def test_unknown_order_is_not_finalized(db):
+    assert orders.finalize_order('order_missing') is None
+    assert not orders.is_finalized('order_missing')
+
+
+def test_webhook_and_verify_race_writes_once(db, product):
+    _checkout('order_b', product)
+    body = {'event': 'payment.captured',
+            'payload': {'payment': {'entity': {'id': 'pay_b', 'order_id': 'order_b'}}}}
+
+    assert orders.enqueue_event('evt_1', body)
+    assert not orders.enqueue_event('evt_1', body)  # redelivery
+    assert orders.enqueue_event('evt_2', dict(body, event='order.paid'))
+    assert orders.drain_events() == 2
+
+    assert orders.finalize_order('order_b', razorpay_payment_id='pay_b') is None
+    assert len(_history(db, 'order_b')) == 1
+
+
+def test_batch_finalizes_only_pending_orders(db, product):
+    _checkout('order_c', product, quantity=1)
+    _checkout('order_d', product, quantity=3)
+    orders.finalize_order('order_c', razorpay_payment_id='pay_c')
+
+    written = orders.finalize_orders({
+        'order_c': {'razorpay_payment_id': 'pay_c'},
+        'order_d': {'razorpay_payment_id': 'pay_d'},
+    })
+    db.session.commit()
+
+    assert written == {'order_d': 1}
+    assert len(_history(db, 'order_c')) == len(_history(db, 'order_d')) == 1
+    assert inventory.stock_level(product)['stock'] == 6
+
+
+def _verify(app, client, order_id, user_id=1):
+    signature = app.extensions['payment_gateway'].client.sign_payment(order_id, 'pay_legacy')
+    return client.post('/cart/verify_payment', json={
+        'razorpay_order_id': order_id, 'razorpay_payment_id': 'pay_legacy',
+        'razorpay_signature': signature, 'user_id': user_id,
+    })
+
+
+def test_verify_adopts_an_item_order_from_before_the_ledger(app, client, db, product):
+    order = app.extensions['payment_gateway'].create_order({
+        'amount': 75000, 'currency': 'INR', 'receipt': f'order_rcptid_{product}_1700000000.0',
+        'notes': {'quantity': '3'},
+    })
+
+    assert _verify(app, client, order['id']).status_code == 200
+    assert _verify(app, client, order['id']).status_code == 200
+
+    [row] = _history(db, order['id'])
+    assert (row.user_id, row.product_id, row.quantity, row.price_at_purchase) == (1, product, 3, 250.0)
+    assert inventory.stock_level(product)['stock'] == 10  # nothing was held for it
+
+
+def test_verify_adopts_a_cart_order_from_before_the_ledger(app, client, db, product):
+    client.post('/cart', json={'userId': 4, 'productId': product, 'productName': 'Tea', 'quantity': 2})
+    order = app.extensions['payment_gateway'].create_order({
+        'amount': 50000, 'currency': 'INR', 'receipt': 'order_rcptid_4_1700000000.0',
+    })
+
+    assert _verify(app, client, order['id'], user_id=4).status_code == 200
+
+    [row] = _history(db, order['id'])
+    assert (row.user_id, row.quantity) == (4, 2)
+    assert db.session.execute(db.select(Cart).where(Cart.user_id == 4)).first() is None
+
+
+def test_verify_refuses_orders_it_cannot_rebuild(app, client, db, product):
+    client.post('/cart', json={'userId': 4, 'productId': product, 'productName': 'Tea', 'quantity': 1})
+    changed_cart = app.extensions['payment_gateway'].create_order({
+        'amount': 50000, 'currency': 'INR', 'receipt': 'order_rcptid_4_1700000000.0',
+    })
+
+    assert _verify(app, client, changed_cart['id'], user_id=4).status_code == 404
+    assert _verify(app, client, 'order_missing').status_code == 404
+    assert not orders.is_finalized(changed_cart['id'])
+
+
+def _paid_event(order_id, payment_id):
+    return {'event': 'payment.captured',
+            'payload': {'payment': {'entity': {'id': payment_id, 'order_id': order_id}}}}
+
+
+def test_webhook_finalizes_item_orders_with_a_buyer(client, db, product):
+    checkout = client.post('/cart/buy_item', json={'product_id': product, 'quantity': 1, 'user_id': 3}).get_json()
+
+    orders.enqueue_event('evt_item', _paid_event(checkout['order_id'], 'pay_item'))
+    orders.drain_events()
+
+    [row] = _history(db, checkout['order_id'])
+    assert row.user_id == 3
+
+
+def test_webhook_leaves_orders_without_a_buyer_unmatched(app, db, product):
+    _checkout('order_e', product, user_id=None)
+    orders.enqueue_event('evt_e', _paid_event('order_e', 'pay_e'))
+    orders.drain_events()
+
+    assert not orders.is_finalized('order_e')
+    [(event, pending)] = orders.unmatched_events()
+    assert (event.status, pending.razorpay_order_id) == ('unmatched', 'order_e')
+    listing = app.test_cli_runner().invoke(args=['payments', 'unmatched']).output
+    assert 'order_e  pay_e' in listing and '1 unmatched events.' in listing
+
+    assert orders.finalize_order('order_e', razorpay_payment_id='pay_e', user_id=9) == 1
+    assert orders.unmatched_events() == []
+    assert db.session.execute(db.select(PaymentEvent.status)).scalar() == 'done'
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+import razorpay
+
+from services import payments
+
+
+def test_emulator_fetch_order_returns_created_order(app):
+    gateway = app.extensions['payment_gateway']
+    order = gateway.create_order({'amount': 49900, 'currency': 'INR', 'receipt': 'rcpt_1'})
+
+    fetched = gateway.fetch_order(order['id'])
+
+    assert fetched['id'] == order['id']
+    assert fetched['amount'] == 49900
+    assert fetched['status'] == 'created'
+
+
+def test_emulator_fetch_order_unknown_id(app):
+    with pytest.raises(razorpay.errors.BadRequestError):
+        app.extensions['payment_gateway'].fetch_order('order_missing')
+
+
+def test_async_emulator_creates_orders_fetchable_by_sync_gateway(app):
+    async def create():
+        gateway = app.extensions['payment_gateway_async']
+        try:
+            return await gateway.create_order({'amount': 10000, 'currency': 'INR'})
+        finally:
+            await gateway.aclose()
+
+    order = asyncio.run(create())
+
+    assert app.extensions['payment_gateway'].fetch_order(order['id'])['amount'] == 10000
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = payments.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    gateway = payments.PaymentGateway(lambda: None, breaker, timeout=(1, 1))
+
+    def failing(*args, timeout):
+        raise razorpay.errors.ServerError('down')
+
+    for _ in range(2):
+        with pytest.raises(payments.GatewayUnavailable):
+            gateway._call('order.create', failing)
+
+    assert breaker.state == 'open'
+    with pytest.raises(payments.GatewayUnavailable, match='circuit is open'):
+        gateway._call('order.create', failing)
@@ -0,0 +1,128 @@
+import pytest
+
+from services import rate_limit, tokens
+from services.rate_limit import MemoryBuckets, RateLimiter, Rule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    buckets = MemoryBuckets(max_keys=100)
+
+    assert [buckets.take('k', 1.0, 3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take('k', 1.0, 3) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert buckets.take('k', 1.0, 3) == pytest.approx(0.5)  # refused calls take nothing
+    clock.now += 0.5
+    assert buckets.take('k', 1.0, 3) == 0
+    assert buckets.take('k', 1.0, 3) == pytest.approx(1.0)
+
+
+def test_full_buckets_expire_and_keys_are_bounded(clock):
+    buckets = MemoryBuckets(max_keys=2)
+    buckets.take('a', 1.0, 2)
+    buckets.take('b', 1.0, 2)
+    buckets.take('c', 1.0, 2)
+    assert len(buckets) == 2  # 'a', the coldest, was evicted
+
+    clock.now += 2  # 'b' and 'c' have refilled completely
+    buckets.take('d', 1.0, 2)
+    assert len(buckets) == 1
+
+
+def test_rule_parses_rates():
+    rule = Rule('ip', '30/minute')
+    assert (rule.capacity, rule.rate) == (30, 0.5)
+    for spec in ('30', '0/minute', 'x/minute', '10/fortnight'):
+        with pytest.raises(ValueError):
+            Rule('ip', spec)
+
+
+def test_limiter_keys_users_by_id_and_anonymous_clients_by_ip(clock):
+    limiter = RateLimiter(MemoryBuckets(100))
+    rules = [Rule('ip', '3/minute'), Rule('user', '1/minute')]
+
+    assert limiter.check('login', rules, '1.1.1.1', user_id=5) is None
+    assert limiter.check('login', rules, '2.2.2.2', user_id=5) == pytest.approx(60)  # same user, new IP
+    assert limiter.check('login', rules, '1.1.1.1') is None  # anonymous: its own IP bucket
+    assert limiter.check('login', rules, '1.1.1.1') == pytest.approx(60)
+    assert limiter.snapshot()['limited'] == 2
+
+
+def test_client_ip_behind_trusted_proxies():
+    limiter = RateLimiter(MemoryBuckets(10), proxy_count=1)
+    assert limiter.client_ip('10.0.0.1', ['6.6.6.6', '203.0.113.9']) == '203.0.113.9'
+    assert RateLimiter(MemoryBuckets(10)).client_ip('10.0.0.1', ['6.6.6.6']) == '10.0.0.1'
+
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    limiter = app.extensions['rate_limit']
+    monkeypatch.setattr(limiter, 'enabled', True)
+    monkeypatch.setattr(limiter, 'buckets', MemoryBuckets(100))
+    return limiter
+
+
+def test_route_answers_429_with_retry_after(client, limited):
+    statuses = [client.post('/login', json={'username': 'nobody', 'password': 'x'}).status_code
+                for _ in range(10)]
+    limited = client.post('/login', json={'username': 'nobody', 'password': 'x'})
+
+    assert 429 not in statuses
+    assert limited.status_code == 429
+    assert limited.headers['Retry-After'] == '6'  # one token per 60s / 10
+
+
+def test_body_fields_do_not_choose_the_bucket(client, limited):
+    for i in range(10):
+        client.post('/cart/checkout', json={'user_id': i + 1})
+
+    # a fresh user_id doesn't get a fresh bucket...
+    assert client.post('/cart/checkout', json={'user_id': 99}).status_code == 429
+    # ...and a client limited by its IP doesn't use up a signed-in user's
+    with client.application.app_context():
+        token = tokens.issue(7)
+    response = client.post('/cart/checkout', json={'user_id': 7}, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code != 429
+
+
+def test_signed_in_users_are_limited_across_addresses(client, limited):
+    with client.application.app_context():
+        token = tokens.issue(8)
+    headers = {'Authorization': f'Bearer {token}'}
+    for i in range(10):
+        client.post('/cart/checkout', json={'user_id': 8}, headers=headers,
+                    environ_base={'REMOTE_ADDR': f'10.0.0.{i}'})
+
+    response = client.post('/cart/checkout', json={'user_id': 8}, headers=headers,
+                           environ_base={'REMOTE_ADDR': '10.0.1.1'})
+    assert response.status_code == 429
+
+
+def test_concurrency_cap_sheds_with_503(client, app, monkeypatch):
+    limiter = app.extensions['rate_limit']
+    assert limiter.enter()  # a request already in flight...
+    monkeypatch.setattr(limiter, '_slots', rate_limit.threading.BoundedSemaphore(1))
+    limiter._slots.acquire()
+    try:
+        response = client.get('/products/1/stock')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/metrics').status_code == 200  # exempt
+    finally:
+        limiter._slots.release()
+        limiter._count('in_flight', -1)
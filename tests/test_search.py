@@ -0,0 +1,59 @@
+import pytest
+
+from services import search
+
+
+@pytest.fixture
+def catalog(client):
+    search.reindex()  # the FTS table isn't in the models, so it outlives drop_all
+    products = [
+        {'name': 'Green Tea', 'prize': '250', 'details': 'Loose leaf'},
+        {'name': 'Honey', 'prize': '199', 'details': 'Goes well with green tea'},
+        {'name': 'Greek Yogurt', 'prize': '80', 'details': 'Plain'},
+        {'name': 'Ginger Tea', 'prize': '220', 'details': 'Spiced'},
+    ]
+    for product in products:
+        assert client.post('/upload', data=product).status_code == 201
+    return client
+
+
+def _names(response):
+    return [product['name'] for product in response.get_json()]
+
+
+def test_name_matches_rank_above_details(catalog):
+    response = catalog.get('/products/search?q=green tea&fields=id,name')
+
+    assert _names(response) == ['Green Tea', 'Honey']
+
+
+def test_search_pages_with_next_offset(catalog):
+    first = catalog.get('/products/search?q=tea&limit=2&fields=name')
+    second = catalog.get(f"/products/search?q=tea&limit=2&offset={first.headers['X-Next-Offset']}&fields=name")
+
+    assert len(first.get_json()) == 2 and first.headers['X-Next-Offset'] == '2'
+    assert len(second.get_json()) == 1 and 'X-Next-Offset' not in second.headers
+
+
+def test_autocomplete_prefers_names_starting_with_the_text(catalog):
+    assert catalog.get('/products/autocomplete?q=gre').get_json() == [
+        {'id': 1, 'name': 'Green Tea'}, {'id': 3, 'name': 'Greek Yogurt'}]
+    assert _names(catalog.get('/products/autocomplete?q=tea g')) == ['Green Tea', 'Ginger Tea']
+
+
+def test_writes_keep_the_index_in_sync(catalog):
+    assert catalog.put('/products/3', data={'name': 'Greek Honey'}).status_code == 200
+    assert catalog.delete('/products/2').status_code == 200
+
+    assert _names(catalog.get('/products/search?q=honey&fields=name')) == ['Greek Honey']
+    assert _names(catalog.get('/products/search?q=yogurt&fields=name')) == []
+
+
+@pytest.mark.parametrize('query', ['tea OR -honey', '"tea', 'NEAR(tea honey)', '*'])
+def test_query_syntax_is_treated_as_words(catalog, query):
+    assert catalog.get('/products/search', query_string={'q': query}).status_code == 200
+
+
+@pytest.mark.parametrize('query', ['', 'q=tea&limit=0', 'q=tea&offset=5000', 'q=tea&limit=x'])
+def test_bad_search_queries_are_rejected(catalog, query):
+    assert catalog.get(f'/products/search?{query}').status_code == 400
@@ -0,0 +1,10 @@
+"""Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Unlike run.py this does no schema work at startup; apply migrations with
+`flask db upgrade` before starting the new release.
+"""
+from app import create_app
+
+app = create_app()